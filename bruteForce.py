@@ -1,22 +1,317 @@
-import numpy
-import copt
+import math
+import heapq
+import itertools
+import evaluator
+import heuristics
+import solutionStore
 import utilities
 
+# region Constants
+
+# Measures closer together than this are treated as being the same
+# Routed lengths of different shapes are much further apart than this so it only absorbs rounding errors
+MeasureTolerance = 1e-6
+
+# endregion
+
+# region Solution Store
+
+# The store that getSolution checks before searching
+# None means the default store hasn't been looked for yet and False means there isn't a store
+# There is only a default store when the solutionStore.StorePathVariable environment variable is set
+currentStore = None
+
+# Sets the store used by getSolution, or turns it off if None is passed in
+def setSolutionStore(store):
+    global currentStore
+    currentStore = store if (store is not None) else False
+
+# Gets the store used by getSolution, opening the default one the first time it's needed
+# Returns None if no store has been set and the environment variable isn't set
+def getSolutionStore():
+    global currentStore
+
+    if (currentStore is None):
+        defaultStore = solutionStore.getDefaultStore()
+        currentStore = defaultStore if (defaultStore is not None) else False
+
+    return currentStore if (currentStore is not False) else None
+
+# endregion
+
+# region Comparisons
+
+# Checks whether the result is better than the best result found so far
+# Equally good results are split by taking the ordering that comes first so the answer doesn't depend on search order
+def _isBetter(result, bestResult):
+    if (bestResult is None):
+        return True
+    elif (result['measure'] < (bestResult['measure'] - MeasureTolerance)):
+        return True
+    elif (result['measure'] <= (bestResult['measure'] + MeasureTolerance)):
+        return list(result['order']) < list(bestResult['order'])
+    else:
+        return False
+
+# Checks whether no ordering starting with the prefix can be better than the best result found so far
+# The bound is the measure of the prefix plus the lower bounds of the connections left to route
+# An infinite bound means one of the connections left can't be routed, so the prefix is pruned even before any
+# successful ordering has been found
+def _canPrune(prefix, bound, bestResult):
+    if (math.isinf(bound)):
+        return True
+    elif (bestResult is None):
+        return False
+    elif (bound > (bestResult['measure'] + MeasureTolerance)):
+        return True
+    elif (bound >= (bestResult['measure'] - MeasureTolerance)):
+        # The prefix can at best tie, which only helps if it could come before the best ordering
+        return prefix > list(bestResult['order'][:len(prefix)])
+    else:
+        return False
+
+# endregion
+
+# region Incumbents
+
+# Stores the best result found so far when a single process is searching
+class LocalIncumbent():
+
+    # Constructor that starts with no result
+    def __init__(self):
+        self.bestResult = None
+
+    # Returns the best result found so far
+    def get(self):
+        return self.bestResult
+
+    # Replaces the best result if the new result is better
+    def offer(self, result):
+        if (_isBetter(result, self.bestResult)):
+            self.bestResult = result
+
+# Stores the best result found so far in shared memory so that worker processes can prune against each other
+class SharedIncumbent():
+
+    # Constructor that creates the shared values in the fork context the workers are started with
+    # Infinity is used as the measure when no result has been found yet
+    def __init__(self, numberOfPoints):
+        context = utilities.getForkContext()
+        self.lock = context.Lock()
+        self.measure = context.Value('d', math.inf, lock=False)
+        self.order = context.Array('i', numberOfPoints, lock=False)
+
+    def get(self):
+        with self.lock:
+            if (math.isinf(self.measure.value)):
+                return None
+
+            return {'order': list(self.order), 'success': 1, 'measure': self.measure.value}
+
+    def offer(self, result):
+        with self.lock:
+            bestResult = None
+            if (not math.isinf(self.measure.value)):
+                bestResult = {'order': list(self.order), 'success': 1, 'measure': self.measure.value}
+
+            if (_isBetter(result, bestResult)):
+                self.measure.value = result['measure']
+                self.order[:] = list(result['order'])
+
+# Keeps the best k results found so far in a heap with the worst of them at the top
+# The worst of the k results is what new orderings need to beat, so it's used for pruning
+class TopIncumbent():
+
+    # Constructor that starts with an empty heap
+    def __init__(self, numberToKeep):
+        self.numberToKeep = numberToKeep
+        self.heap = []
+
+    # Returns the worst of the best k results, or None if fewer than k have been found
+    def get(self):
+        if (len(self.heap) < self.numberToKeep):
+            return None
+
+        return self.heap[0].result
+
+    # Adds the result if there's space or if it's better than the worst one kept
+    def offer(self, result):
+        if (len(self.heap) < self.numberToKeep):
+            heapq.heappush(self.heap, _HeapEntry(result))
+        elif (_isBetter(result, self.heap[0].result)):
+            heapq.heapreplace(self.heap, _HeapEntry(result))
+
+    # Returns the results kept, best first
+    def getResults(self):
+        return [entry.result for entry in sorted(self.heap, reverse=True)]
+
+# Entry in the top k heap, ordered so that worse results come first
+class _HeapEntry():
+
+    def __init__(self, result):
+        self.result = result
+
+    def __lt__(self, other):
+        return _isBetter(other.result, self.result)
+
+# endregion
+
 # region Get Solution
 
 # Gets the best solution for the inputted problem
-def getSolution(problem):
-    # Gets all the solutions
-    solutions = copt.bruteForce(problem)
+# The orderings are built up one connection at a time so whole subtrees can be skipped
+# A subtree is skipped once its prefix can't be routed or once it can't beat the best ordering found so far
+# If more than one worker is used then the search is split across processes, giving the same answer as one worker
+# Solutions are looked up in the solution store first and added to it once they've been worked out
+# If no ordering can be routed then the ordering 0, 1, 2... is returned with a success and reward of 0, the reward
+# the agents give a failed ordering, rather than whichever failed ordering a full enumeration would have put first
+def getSolution(problem, numberOfWorkers=1):
+    store = getSolutionStore()
+    if (store is not None):
+        storedSolution = store.get(problem)
 
-    # The best solution is always the first one
-    if (len(solutions) != 0):
-        bestOrder = solutions[0]['order']
-        bestReward = (utilities.MaxRewardPerPoint * len(problem)) - solutions[0]['measure']
-        success = solutions[0]['success']
+        if (storedSolution is not None):
+            return storedSolution
 
-        return bestOrder, success, bestReward
+    if (numberOfWorkers > 1):
+        bestResult = getBestResultParallel(problem, numberOfWorkers)
     else:
-        return list(range(0, len(problem))), 0, 0
+        bestResult = getBestResult(problem)
+
+    if (bestResult is not None):
+        bestOrder = list(bestResult['order'])
+        bestReward = (utilities.MaxRewardPerPoint * len(problem)) - bestResult['measure']
+        success = bestResult['success']
+    else:
+        bestOrder, success, bestReward = list(range(0, len(problem))), 0, 0
+
+    if (store is not None):
+        store.put(problem, bestOrder, success, bestReward)
+
+    return bestOrder, success, bestReward
+
+# Gets the result of the best successful ordering, or None if no ordering is successful
+def getBestResult(problem):
+    incumbent = LocalIncumbent()
+    session = evaluator.openSession(problem)
+    _searchOrderings(session, list(range(0, len(problem))), incumbent)
+
+    return incumbent.get()
+
+# Searches all the orderings that start with the session's prefix, offering the successful ones to the incumbent
+# The connections are tried in ascending order so the first of two equally good orderings is found first
+def _searchOrderings(session, remainingConnections, incumbent):
+    # All the connections have been routed so this is a complete ordering
+    if (len(remainingConnections) == 0):
+        incumbent.offer(session.getResult())
+        return
+
+    # Checks that the rest of the connections could still give a better ordering
+    lowerBounds = session.getLowerBounds(remainingConnections)
+    if (_canPrune(session.getOrder(), session.getResult()['measure'] + sum(lowerBounds), incumbent.get())):
+        return
+
+    for connection in remainingConnections:
+        result = session.extend(connection)
+
+        # Only carries on if the prefix was routed
+        if (result['success'] == 1):
+            newRemainingConnections = [otherConnection for otherConnection in remainingConnections if otherConnection != connection]
+            _searchOrderings(session, newRemainingConnections, incumbent)
+
+        session.rollback()
+
+# Yields the best k successful solutions of the problem, best first, as (order, success, reward)
+# Only k results are ever stored and orderings that can't beat the worst of them are pruned
+def getTopSolutions(problem, numberToKeep):
+    incumbent = TopIncumbent(numberToKeep)
+    session = evaluator.openSession(problem)
+    _searchOrderings(session, list(range(0, len(problem))), incumbent)
+
+    for result in incumbent.getResults():
+        yield result['order'], result['success'], (utilities.MaxRewardPerPoint * len(problem)) - result['measure']
+
+# endregion
+
+# region Feasibility
+
+# Finds an ordering of the problem that can be routed, returning None if there isn't one
+# If the problem's solution is in the solution store then its order is used, as it's successful if any order is
+# The search stops at the first successful ordering, trying the shortest connections first as the Manhattan ordering does
+# Once an extension fails, a prefix that blocks one of the remaining connections is abandoned without trying the rest
+def findFeasibleOrder(problem):
+    store = getSolutionStore()
+    if (store is not None):
+        storedSolution = store.get(problem)
+
+        if (storedSolution is not None):
+            return storedSolution[0] if (storedSolution[1] == 1) else None
+
+    session = evaluator.openSession(problem)
+    return _searchFeasible(session, heuristics.ManhattanHeuristic.getOrder(problem))
+
+# Searches for a successful ordering that starts with the session's prefix
+def _searchFeasible(session, remainingConnections):
+    # All the connections have been routed so the ordering is successful
+    if (len(remainingConnections) == 0):
+        return session.getOrder()
+
+    for index, connection in enumerate(remainingConnections):
+        result = session.extend(connection)
+
+        if (result['success'] == 1):
+            newRemainingConnections = [otherConnection for otherConnection in remainingConnections if otherConnection != connection]
+            feasibleOrder = _searchFeasible(session, newRemainingConnections)
+
+            if (feasibleOrder is not None):
+                return feasibleOrder
+
+        session.rollback()
+
+        # The first extension failed, so if one of the remaining connections can't be routed on this board then
+        # no ordering from this prefix can succeed
+        if ((index == 0) and (math.inf in session.getLowerBounds(remainingConnections))):
+            return None
+
+    return None
+
+# endregion
+
+# region Parallel Search
+
+# The incumbent shared by the worker processes
+_sharedIncumbent = None
+
+# Stores the shared incumbent in the worker process
+def _initialiseWorker(incumbent):
+    global _sharedIncumbent
+    _sharedIncumbent = incumbent
+
+# Searches all the orderings that start with the prefix in a worker process
+def _searchShard(arguments):
+    problem, prefix = arguments
+    session = evaluator.openSession(problem)
+
+    # Routes the prefix, stopping if it fails
+    for connection in prefix:
+        if (session.extend(connection)['success'] == 0):
+            return
+
+    remainingConnections = [connection for connection in range(0, len(problem)) if connection not in prefix]
+    _searchOrderings(session, remainingConnections, _sharedIncumbent)
+
+# Gets the result of the best successful ordering by splitting the orderings across worker processes by their first connections
+# The workers share the best result so they prune against each other
+# As equally good orderings are split by the ordering that comes first, the answer doesn't depend on how the work was scheduled
+def getBestResultParallel(problem, numberOfWorkers, prefixLength=2):
+    prefixLength = min(prefixLength, len(problem))
+    prefixes = [list(prefix) for prefix in itertools.permutations(range(0, len(problem)), prefixLength)]
+
+    incumbent = SharedIncumbent(len(problem))
+    with utilities.getForkContext().Pool(numberOfWorkers, initializer=_initialiseWorker, initargs=(incumbent,)) as pool:
+        for _ in pool.imap_unordered(_searchShard, [(problem, prefix) for prefix in prefixes]):
+            pass
+
+    return incumbent.get()
 
 # endregion
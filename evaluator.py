@@ -0,0 +1,524 @@
+import abc
+import collections
+import hashlib
+import importlib
+import itertools
+import os
+import threading
+import numpyRouter
+import utilities
+
+# region Constants
+
+# Environment variable that can be used to pick the evaluation backend ("copt" or "numpy")
+BackendVariable = "EVALUATOR_BACKEND"
+
+# Default limits on the number of results and the approximate number of bytes held by the evaluation cache
+DefaultCacheEntries = 200000
+DefaultCacheBytes = 64 * 1024 * 1024
+
+# Approximate number of bytes used by a cached result, not including its order
+CacheEntryOverhead = 240
+
+# Number of problems generated at once by iterateProblems
+ProblemBatchSize = 256
+
+# endregion
+
+# region Evaluation Cache
+
+# Gets the key used to store the result of evaluating the order on the problem
+# The problem and order are converted to plain integers so the same ordering always gets the same key
+def getEvaluationKey(problem, order):
+    problemText = ";".join(",".join(str(int(value)) for value in point) for point in problem)
+    orderText = ",".join(str(int(connection)) for connection in order)
+
+    return hashlib.blake2b((problemText + "|" + orderText).encode(), digest_size=16).digest()
+
+# Least recently used cache of evaluation results
+# The cache is bounded by both the number of results and the approximate memory they use
+class EvaluationCache():
+
+    # Constructor that initialises the cache and the counters
+    def __init__(self, maxEntries=DefaultCacheEntries, maxBytes=DefaultCacheBytes):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+
+        # Results in least to most recently used order, along with their sizes
+        self.results = collections.OrderedDict()
+        self.currentBytes = 0
+
+        # Initialises the hit, miss and eviction counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Lock to stop multiple threads changing the cache at the same time
+        self.lock = threading.Lock()
+
+    # Gets a copy of the cached result, or None if it isn't in the cache
+    def get(self, key):
+        with self.lock:
+            try:
+                result, _ = self.results[key]
+            except KeyError:
+                self.misses += 1
+                return None
+
+            self.results.move_to_end(key)
+            self.hits += 1
+
+        return {'order': list(result['order']), 'success': result['success'], 'measure': result['measure']}
+
+    # Adds the result to the cache, removing the least recently used results if it's full
+    def put(self, key, result):
+        size = CacheEntryOverhead + (8 * len(result['order']))
+        storedResult = {'order': list(result['order']), 'success': result['success'], 'measure': result['measure']}
+
+        with self.lock:
+            if (key in self.results):
+                self.currentBytes -= self.results.pop(key)[1]
+
+            self.results[key] = (storedResult, size)
+            self.currentBytes += size
+
+            while ((len(self.results) > self.maxEntries) or (self.currentBytes > self.maxBytes)):
+                _, (_, evictedSize) = self.results.popitem(last=False)
+                self.currentBytes -= evictedSize
+                self.evictions += 1
+
+    # Removes all the results from the cache
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+            self.currentBytes = 0
+
+    # Returns the hit, miss and eviction counters along with the current size of the cache
+    def getStatistics(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self.results), 'bytes': self.currentBytes}
+
+# endregion
+
+# region Base Class
+
+# Base Evaluator class that all the evaluation backends need to implement
+# The results returned are dictionaries with the keys 'order', 'success' and 'measure'
+class BaseEvaluator():
+    # Declares this class as an abstract class
+    __metaclass__ = abc.ABCMeta
+
+    # Routes the connections in the given order and returns the result
+    @abc.abstractmethod
+    def evaluate(self, problem, order):
+        return
+
+    # Routes each of the orders for the same problem and returns a list of the results
+    @abc.abstractmethod
+    def evaluateMulti(self, problem, orders):
+        return
+
+    # Returns the results of every ordering with the best result first
+    @abc.abstractmethod
+    def bruteForce(self, problem):
+        return
+
+    # Returns a random problem with the given number of points
+    @abc.abstractmethod
+    def getProblem(self, numberOfPoints):
+        return
+
+    # Returns the version of the backend's routing, which changes whenever the same problem could be routed differently
+    # By default the backend has a single version
+    def getVersion(self):
+        return "1"
+
+    # Returns a list of random problems with the given number of points
+    # By default the problems are made one at a time with getProblem
+    def getProblems(self, numberOfProblems, numberOfPoints):
+        return [self.getProblem(numberOfPoints) for _ in range(0, numberOfProblems)]
+
+    # Returns a session that builds an ordering of the problem one connection at a time
+    # By default the session re-evaluates the whole prefix each time it is extended
+    def openSession(self, problem):
+        return ReplaySession(problem)
+
+    # Returns, for each connection, the smallest amount it could add to the measure
+    # By default nothing is known about the measure so the bounds are all 0
+    def getLowerBounds(self, problem):
+        return [0] * len(problem)
+
+    # Seeds the backend's own random problems so the same problems are generated each time
+    # By default the backend's own generator can't be seeded so this does nothing
+    def seedProblems(self, seed):
+        return
+
+# endregion
+
+# region Sessions
+
+# Base Session class for building up an ordering one connection at a time
+# Each extension returns the result of the new prefix in the same format as evaluate
+class BaseSession():
+    # Declares this class as an abstract class
+    __metaclass__ = abc.ABCMeta
+
+    # Adds the connection to the end of the current prefix and returns the result of the new prefix
+    @abc.abstractmethod
+    def extend(self, connection):
+        return
+
+    # Removes the last connection from the prefix
+    @abc.abstractmethod
+    def rollback(self):
+        return
+
+    # Returns an independent session with the same prefix so the search can branch from it
+    @abc.abstractmethod
+    def fork(self):
+        return
+
+    # Returns the result of the current prefix
+    @abc.abstractmethod
+    def getResult(self):
+        return
+
+    # Returns the current prefix
+    def getOrder(self):
+        return self.getResult()['order']
+
+    # Returns the number of connections in the current prefix
+    def getLength(self):
+        return len(self.getOrder())
+
+    # Returns, for each of the connections, the smallest amount it could add to the measure after the current prefix
+    # By default the bounds don't depend on the prefix
+    def getLowerBounds(self, connections):
+        lowerBounds = getLowerBounds(self.problem)
+        return [lowerBounds[connection] for connection in connections]
+
+# Session that evaluates the whole prefix every time it is extended
+# This is used for backends that can't route a connection on top of an existing prefix
+class ReplaySession(BaseSession):
+
+    # Constructor that starts with an empty prefix
+    def __init__(self, problem):
+        self.problem = problem
+        self.results = [{'order': [], 'success': 1, 'measure': 0}]
+
+    def extend(self, connection):
+        result = evaluate(self.problem, self.results[-1]['order'] + [connection])
+        self.results.append(result)
+
+        return result
+
+    def rollback(self):
+        if (len(self.results) > 1):
+            self.results.pop()
+
+    def fork(self):
+        newSession = ReplaySession(self.problem)
+        newSession.results = list(self.results)
+
+        return newSession
+
+    def getResult(self):
+        return self.results[-1]
+
+# Session that keeps the routed wires of the prefix so only the new connection needs to be routed
+# If a prefix is already in the evaluation cache then its wires aren't routed until a later prefix needs them
+class RouterSession(BaseSession):
+
+    # Constructor that starts with an empty board
+    def __init__(self, router):
+        self.router = router
+        self.problem = router.problem
+        self.order = []
+        self.results = [{'order': [], 'success': 1, 'measure': 0}]
+
+        # The routed board after each connection, None when the connection hasn't been routed yet
+        self.states = [router.getEmptyState()]
+
+    def extend(self, connection):
+        self.order.append(connection)
+
+        # Uses the cached result if there is one
+        key = getEvaluationKey(self.router.problem, self.order)
+        result = evaluationCache.get(key)
+
+        if (result is None):
+            state = self.__getState(len(self.order) - 1).copy()
+            self.states.append(self.router.routeConnection(state, connection))
+            result = state.getResult()
+            evaluationCache.put(key, result)
+        else:
+            self.states.append(None)
+
+        self.results.append(result)
+        return result
+
+    # Gets the routed board after the given number of connections, routing any that were skipped
+    def __getState(self, length):
+        lastRouted = length
+        while (self.states[lastRouted] is None):
+            lastRouted -= 1
+
+        for index in range(lastRouted, length):
+            self.states[index + 1] = self.router.routeConnection(self.states[index].copy(), self.order[index])
+
+        return self.states[length]
+
+    def rollback(self):
+        if (len(self.order) > 0):
+            self.order.pop()
+            self.states.pop()
+            self.results.pop()
+
+    # The routed states are never changed once they are made so the forked session can share them
+    def fork(self):
+        newSession = RouterSession(self.router)
+        newSession.order = list(self.order)
+        newSession.results = list(self.results)
+        newSession.states = list(self.states)
+
+        return newSession
+
+    def getResult(self):
+        return self.results[-1]
+
+    def getLength(self):
+        return len(self.order)
+
+    # The bounds are worked out on the board of the current prefix, so wires it blocks give infinite bounds
+    def getLowerBounds(self, connections):
+        state = self.__getState(len(self.order))
+        return [self.router.getStateLowerBound(state, connection) for connection in connections]
+
+# endregion
+
+# region Copt Evaluator
+
+# Evaluator that uses the compiled copt module
+# This is only available on machines that have a build of copt
+class CoptEvaluator(BaseEvaluator):
+    name = "copt"
+
+    # Constructor that imports the copt module
+    def __init__(self):
+        self.copt = importlib.import_module("copt")
+
+    def evaluate(self, problem, order):
+        return self.copt.evaluate(problem, order)
+
+    def evaluateMulti(self, problem, orders):
+        return list(self.copt.evaluateMulti(problem, orders))
+
+    def bruteForce(self, problem):
+        return self.copt.bruteForce(problem)
+
+    def getProblem(self, numberOfPoints):
+        return self.copt.getProblem(numberOfPoints)
+
+    # Builds of copt that have a version give it, otherwise the default is used
+    def getVersion(self):
+        return str(getattr(self.copt, "__version__", super().getVersion()))
+
+# endregion
+
+# region NumPy Evaluator
+
+# Evaluator that routes the wires with the NumPy 45 degree router
+# This is pure Python and NumPy so runs on any platform
+class NumpyEvaluator(BaseEvaluator):
+    name = "numpy"
+
+    # Constructor that initialises the router for the last problem seen
+    # Most solvers evaluate lots of orderings of the same problem so the grid setup is reused
+    def __init__(self):
+        self.lastRouter = (None, None)
+
+    # Gets the router for the problem, reusing the last one if the problem hasn't changed
+    # The problem and router are stored together so threads never see a router for a different problem
+    def getRouter(self, problem):
+        problemKey = tuple(tuple(point) for point in problem)
+        lastProblem, router = self.lastRouter
+
+        if (problemKey != lastProblem):
+            router = numpyRouter.ProblemRouter(problemKey)
+            self.lastRouter = (problemKey, router)
+
+        return router
+
+    def evaluate(self, problem, order):
+        return self.getRouter(problem).evaluate(order)
+
+    def evaluateMulti(self, problem, orders):
+        return self.getRouter(problem).evaluateMulti(orders)
+
+    def bruteForce(self, problem):
+        orders = [list(order) for order in itertools.permutations(range(0, len(problem)))]
+        results = self.evaluateMulti(problem, orders)
+
+        # Successful orderings come first, with the shortest total wire length at the front
+        results.sort(key=lambda result: (-result['success'], result['measure']))
+        return results
+
+    # The problems are made by the seeded generator shared with iterateProblems
+    def getProblem(self, numberOfPoints):
+        return numpyRouter.getProblem(numberOfPoints, generator=problemGenerator)
+
+    def getProblems(self, numberOfProblems, numberOfPoints):
+        return numpyRouter.getProblems(numberOfProblems, numberOfPoints, generator=problemGenerator)
+
+    def getVersion(self):
+        return numpyRouter.getRouterVersion()
+
+    # Sessions use the same router as evaluate, so a session for the last problem seen doesn't set up the grid again
+    # The router isn't changed once it has been set up (each session keeps its own boards) so sessions can share it
+    def openSession(self, problem):
+        return RouterSession(self.getRouter(problem))
+
+    # A wire can't be shorter than its route when there are no other wires on the board
+    def getLowerBounds(self, problem):
+        router = self.getRouter(problem)
+        return [router.getLowerBound(connection) for connection in range(0, len(problem))]
+
+# endregion
+
+# region Backend Selection
+
+# All the backends that can be chosen
+Backends = {CoptEvaluator.name: CoptEvaluator, NumpyEvaluator.name: NumpyEvaluator}
+
+# The backend currently being used
+currentEvaluator = None
+
+# The cache that all the evaluations go through
+evaluationCache = EvaluationCache()
+
+# Sets the backend that all the evaluations will go through
+# The cache is cleared as the results of different backends aren't the same
+def setBackend(name):
+    global currentEvaluator
+
+    if (name not in Backends):
+        raise ValueError("Unknown evaluator backend: " + str(name))
+
+    currentEvaluator = Backends[name]()
+    evaluationCache.clear()
+
+# Changes the limits on the evaluation cache, removing all the results currently in it
+def setCacheLimits(maxEntries, maxBytes):
+    global evaluationCache
+
+    evaluationCache = EvaluationCache(maxEntries, maxBytes)
+
+# Returns the hit, miss and eviction counters of the evaluation cache
+def getCacheStatistics():
+    return evaluationCache.getStatistics()
+
+# Gets the backend being used
+# If one hasn't been set then the environment variable is used, otherwise copt is used if it's installed
+def getEvaluator():
+    if (currentEvaluator is None):
+        name = os.environ.get(BackendVariable)
+
+        if (name is not None):
+            setBackend(name.lower())
+        else:
+            try:
+                setBackend(CoptEvaluator.name)
+            except ImportError:
+                setBackend(NumpyEvaluator.name)
+
+    return currentEvaluator
+
+# Gets the name of the backend being used
+def getBackendName():
+    return getEvaluator().name
+
+# Gets the version of the routing of the backend being used
+def getBackendVersion():
+    return getEvaluator().getVersion()
+
+# endregion
+
+# region Evaluation
+
+# Routes the connections in the given order and returns the result
+# Results that have already been worked out are taken from the evaluation cache
+def evaluate(problem, order):
+    key = getEvaluationKey(problem, order)
+    result = evaluationCache.get(key)
+
+    if (result is None):
+        result = getEvaluator().evaluate(problem, order)
+        evaluationCache.put(key, result)
+
+    return result
+
+# Routes each of the orders for the same problem and returns a list of the results
+# Only the orders that aren't in the evaluation cache are sent to the backend
+def evaluateMulti(problem, orders):
+    keys = [getEvaluationKey(problem, order) for order in orders]
+    results = [evaluationCache.get(key) for key in keys]
+
+    missingIndexes = [index for index in range(0, len(orders)) if results[index] is None]
+    if (len(missingIndexes) > 0):
+        missingResults = getEvaluator().evaluateMulti(problem, [orders[index] for index in missingIndexes])
+
+        for index, result in zip(missingIndexes, missingResults):
+            evaluationCache.put(keys[index], result)
+            results[index] = result
+
+    return results
+
+# Returns the results of every ordering with the best result first
+def bruteForce(problem):
+    return getEvaluator().bruteForce(problem)
+
+# Returns a random problem with the given number of points
+def getProblem(numberOfPoints):
+    return getEvaluator().getProblem(numberOfPoints)
+
+# Random generator for the problems that aren't made by the backend itself
+problemGenerator = utilities.getRandomGenerator()
+
+# Seeds the random problems returned by getProblem and iterateProblems, including the backend's own if it allows it
+def seedProblems(seed):
+    global problemGenerator
+
+    problemGenerator = utilities.getRandomGenerator(seed)
+    getEvaluator().seedProblems(seed)
+
+# Yields valid random problems with the given number of points, numberOfProblems of them or forever if it's None
+# A squareSize of 0 gives the backend's problems, otherwise the coordinates are in squares with that side length
+# The problems are made ProblemBatchSize at a time, and any the backend makes that aren't valid are skipped
+def iterateProblems(numberOfPoints, squareSize=0, numberOfProblems=None):
+    remainingProblems = numberOfProblems
+
+    while ((remainingProblems is None) or (remainingProblems > 0)):
+        batchSize = ProblemBatchSize if (remainingProblems is None) else min(ProblemBatchSize, remainingProblems)
+
+        if (squareSize == 0):
+            problems = getEvaluator().getProblems(batchSize, numberOfPoints)
+        else:
+            problems = [utilities.getProblemList(problemArray) for problemArray in utilities.generateProblems(batchSize, numberOfPoints, squareSize, problemGenerator)]
+
+        for problem in problems:
+            if (utilities.checkValidProblem(problem)):
+                if (remainingProblems is not None):
+                    remainingProblems -= 1
+
+                yield problem
+
+# Returns a session that builds an ordering of the problem one connection at a time
+def openSession(problem):
+    return getEvaluator().openSession(problem)
+
+# Returns, for each connection, the smallest amount it could add to the measure
+def getLowerBounds(problem):
+    return getEvaluator().getLowerBounds(problem)
+
+# endregion
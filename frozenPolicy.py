@@ -0,0 +1,134 @@
+import json
+import os
+import numpy
+import evaluator
+import heuristics
+import utilities
+
+# region Constants
+
+# Version of the frozen policy format, increased whenever the files change
+PolicyVersion = 1
+
+# Names of the files that make up a frozen policy directory
+HeaderFile = "header.json"
+ProblemKeysFile = "problemKeys.npy"
+RootsFile = "roots.npy"
+ChildrenFile = "children.npy"
+BestActionsFile = "bestActions.npy"
+
+# endregion
+
+# region Export
+
+# Distils a trained Q-Learning agent into the best action of every state it has seen
+# None of the training values are kept, only what is needed to find a state and its best action
+# The problem keys are sorted so a problem can be found with a binary search rather than a dictionary
+# An agent that hasn't seen any problems has nothing to export so it isn't accepted
+def exportPolicy(agent, path):
+    if ((agent.stateIndex.getNumberOfProblems() == 0) or (agent.stateIndex.getNumberOfStates() == 0)):
+        raise ValueError("The agent hasn't learnt from any problems so there is no policy to export")
+
+    os.makedirs(path, exist_ok=True)
+    indexArrays = agent.stateIndex.getArrays()
+
+    # Sorts the problem keys, storing them as fixed length byte strings so they can be binary searched
+    # All the keys are the same length so removing trailing zero bytes, which NumPy does, keeps them unique and in order
+    problemKeys = indexArrays['problemKeys']
+    problemKeys = numpy.ascontiguousarray(problemKeys).view("S" + str(problemKeys.shape[1])).ravel()
+    sortedProblems = numpy.argsort(problemKeys, kind="stable")
+
+    numpy.save(os.path.join(path, ProblemKeysFile), problemKeys[sortedProblems])
+    numpy.save(os.path.join(path, RootsFile), indexArrays['roots'][sortedProblems])
+    numpy.save(os.path.join(path, ChildrenFile), indexArrays['children'].reshape(-1, agent.points))
+    numpy.save(os.path.join(path, BestActionsFile), agent.qTable.getGreedyActions().astype(numpy.int16))
+
+    # Writes the header last so a policy that was only partly exported can't be read
+    header = {'version': PolicyVersion, 'numberOfPoints': agent.points, 'roundNumber': agent.roundNumber,
+              'reduceSymmetry': agent.reduceSymmetry, 'backend': evaluator.getBackendName()}
+    with open(os.path.join(path, HeaderFile), "w") as headerFile:
+        json.dump(header, headerFile)
+
+# endregion
+
+# region Frozen Policy
+
+# Gets solutions from a policy exported from a Q-Learning agent
+# The arrays are memory mapped read only, so many processes can share one copy through the page cache,
+# and getting a solution never changes the policy so no locks are needed
+class FrozenPolicy():
+
+    # Constructor that checks the header and memory maps the arrays
+    def __init__(self, path):
+        with open(os.path.join(path, HeaderFile)) as headerFile:
+            self.header = json.load(headerFile)
+
+        if (self.header['version'] != PolicyVersion):
+            raise ValueError("Unsupported policy version: " + str(self.header['version']))
+
+        self.points = self.header['numberOfPoints']
+        self.roundNumber = self.header['roundNumber']
+        self.reduceSymmetry = self.header['reduceSymmetry']
+
+        self.problemKeys = numpy.load(os.path.join(path, ProblemKeysFile), mmap_mode="r")
+        self.roots = numpy.load(os.path.join(path, RootsFile), mmap_mode="r")
+        self.children = numpy.load(os.path.join(path, ChildrenFile), mmap_mode="r")
+        self.bestActions = numpy.load(os.path.join(path, BestActionsFile), mmap_mode="r")
+
+    # Gets the state of the empty ordering of the problem with the key, or -1 if the problem wasn't seen
+    def __findRoot(self, problemKey):
+        if (len(self.problemKeys) == 0):
+            return -1
+
+        key = numpy.array(problemKey, dtype=self.problemKeys.dtype)
+        problemIndex = int(numpy.searchsorted(self.problemKeys, key))
+
+        if ((problemIndex < len(self.problemKeys)) and (self.problemKeys[problemIndex] == key)):
+            return int(self.roots[problemIndex])
+
+        return -1
+
+    # Gets a solution to the problem in the same format as the agents and heuristics
+    def getSolution(self, problem):
+        permutedProblem, permutation, problemKey = utilities.getPermutedProblem(problem, self.roundNumber, self.reduceSymmetry)
+        state = self.__findRoot(problemKey)
+
+        # Stores the current points ordering
+        currentOrder = []
+
+        # Opens a session so each action only needs the new connection routing
+        session = evaluator.openSession(permutedProblem)
+
+        # Default values for success and reward
+        success = 0
+        reward = 0
+
+        for point in range(0, self.points):
+            # Gets the best action, or the action which connects the closest two points if there isn't one
+            nextAction = int(self.bestActions[state]) if (state != -1) else -1
+            if (nextAction == -1):
+                nextAction = heuristics.ManhattanHeuristic().getNextAction(permutedProblem, currentOrder)
+
+            # Checks to see how well the action has done
+            result = session.extend(nextAction)
+            currentOrder.append(nextAction)
+
+            reward = (utilities.MaxRewardPerPoint * len(currentOrder)) - result["measure"]
+            success = result["success"]
+
+            if (success == 0):
+                # If the action was unsuccessful then the reward is 0 and can finish with this problem
+                reward = 0
+                break
+
+            # Moves to the state after the action
+            state = int(self.children[state, nextAction]) if (state != -1) else -1
+
+        # Unpermutes the order, storing -1 where there is nothing
+        returnOrder = [-1]*self.points
+        for i in range(0, len(currentOrder)):
+            returnOrder[i] = permutation[currentOrder[i]]
+
+        return returnOrder, success, reward
+
+# endregion
@@ -1,5 +1,5 @@
 import numpy
-import copt
+import evaluator
 import abc
 import random
 import math
@@ -29,6 +29,20 @@ class ManhattanHeuristic(BaseHeuristic):
 
     # Gets a solution to the problem using the Manhattan Heuristic
     def getSolution(self, problem):
+        # Gets the ordering with the shortest connections first
+        order = self.getOrder(problem)
+
+        # Submits the ordering to see how well it did and returns the result and action
+        result = evaluator.evaluate(problem, order)
+        return result['order'], result['success'], (utilities.MaxRewardPerPoint * len(problem)) - result['measure']
+
+    # endregion
+
+    # region Get Order
+
+    # Gets the ordering of the connections from shortest to longest
+    @staticmethod
+    def getOrder(problem):
         # Sets up the order and distance variables
         order = []
         distances = []
@@ -59,9 +73,7 @@ class ManhattanHeuristic(BaseHeuristic):
                 distances.append(distance)
                 order.append(x)
 
-        # Submits the ordering to see how well it did and returns the result and action
-        result = copt.evaluate(problem, order)
-        return result['order'], result['success'], (utilities.MaxRewardPerPoint * numberOfPoints) - result['measure']
+        return order
 
     # endregion
 
@@ -121,7 +133,7 @@ class RandomHeuristic(BaseHeuristic):
             indexes.remove(indexes[index])
 
         # Submits the ordering to see how well it did and returns the result and success
-        result = copt.evaluate(problem, order)
+        result = evaluator.evaluate(problem, order)
         return result['order'], result['success'], (utilities.MaxRewardPerPoint * numberOfPoints) - result['measure']
 
     # endregion
@@ -150,6 +162,10 @@ class RandomHeuristic(BaseHeuristic):
 # This class uses the Hill Climbing Heuristic to obtain solutions
 class HillClimbing(BaseHeuristic):
 
+    # Constructor that sets how many neighbours are sent to the evaluator at once
+    def __init__(self, chunkSize=64):
+        self.chunkSize = chunkSize
+
     # Gets the solution via the hill climbing heuristic
     def getSolution(self, problem):
         # Get an initial random solution
@@ -166,18 +182,19 @@ class HillClimbing(BaseHeuristic):
             bestNeighbourReward = 0
             neighbours = utilities.getNeighbours(currentSolution)
 
-            # Loop through all the neighbours
-            for neighbour in neighbours:
-                # Get the result for this ordering
-                result = copt.evaluate(problem, neighbour)
+            # Evaluates the neighbours in batches so the cost of each call to the evaluator is shared
+            for neighbourChunk in utilities.getChunks(neighbours, self.chunkSize):
+                results = evaluator.evaluateMulti(problem, neighbourChunk)
 
-                # Check to see if this reward is better
-                if ((result['success'] == 1) and (((utilities.MaxRewardPerPoint * len(problem)) - result['measure']) > bestNeighbourReward)):
-                    bestNeighbourReward = (utilities.MaxRewardPerPoint * len(problem)) - result['measure']
-                    currentSolution = neighbour
+                # Loop through all the neighbours in the batch
+                for neighbour, result in zip(neighbourChunk, results):
+                    # Check to see if this reward is better
+                    if ((result['success'] == 1) and (((utilities.MaxRewardPerPoint * len(problem)) - result['measure']) > bestNeighbourReward)):
+                        bestNeighbourReward = (utilities.MaxRewardPerPoint * len(problem)) - result['measure']
+                        currentSolution = neighbour
 
         # Gets all the values for the chosen ordering
-        result = copt.evaluate(problem, currentSolution)
+        result = evaluator.evaluate(problem, currentSolution)
         return result['order'], result['success'], (utilities.MaxRewardPerPoint * len(problem)) - result['measure']
 
 # endregion
@@ -207,7 +224,7 @@ class SimulatedAnnealing(BaseHeuristic):
             for index in range(0, iterations):
                 # Gets a neighbouring solution and the result
                 neighbourSol = utilities.getPossibleNeighbourSolution(currentSolution)
-                result = copt.evaluate(problem, neighbourSol)
+                result = evaluator.evaluate(problem, neighbourSol)
 
                 # Gets the reward
                 newReward = 0 if result['success'] == 0 else (utilities.MaxRewardPerPoint * len(problem)) - result['measure']
@@ -225,7 +242,7 @@ class SimulatedAnnealing(BaseHeuristic):
             iterations = iterations * beta
 
         # Gets all the values for the chosen ordering
-        result = copt.evaluate(problem, currentSolution)
+        result = evaluator.evaluate(problem, currentSolution)
         return result['order'], result['success'], (utilities.MaxRewardPerPoint * len(problem)) - result['measure']
 
 # endregion
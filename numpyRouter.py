@@ -0,0 +1,366 @@
+import math
+import numpy
+import utilities
+
+# region Constants
+
+# Side length, in problem units, of a single routing grid cell
+GridPitch = 5
+
+# Number of empty cells added around the pins so wires can be routed around the outside
+GridMargin = 10
+
+# Number of cells around a wire or pin that other wires are not allowed to enter
+ClearanceCells = 1
+
+# The 8 directions a wire can move in, horizontally, vertically and at 45 degrees, with the cost of each move
+Directions = [(0, 1, 1.0), (0, -1, 1.0), (1, 0, 1.0), (-1, 0, 1.0),
+              (1, 1, math.sqrt(2)), (1, -1, math.sqrt(2)), (-1, 1, math.sqrt(2)), (-1, -1, math.sqrt(2))]
+
+# Side length of the squares that the random problems are generated in
+DefaultSquareSize = 100
+
+# Version of the routing, increased whenever a change to how wires are routed changes the results
+RouterVersion = 1
+
+# endregion
+
+# region Grid Helpers
+
+# Returns the slices of a grid that line up a cell with its neighbour in the direction (rowStep, columnStep)
+# The first pair of slices is for the destination cells and the second pair is for the source cells
+def _shiftSlices(rowStep, columnStep):
+    destinationRows = slice(rowStep, None) if (rowStep > 0) else slice(None, rowStep if rowStep < 0 else None)
+    sourceRows = slice(None, -rowStep) if (rowStep > 0) else slice(-rowStep if rowStep < 0 else None, None)
+    destinationColumns = slice(columnStep, None) if (columnStep > 0) else slice(None, columnStep if columnStep < 0 else None)
+    sourceColumns = slice(None, -columnStep) if (columnStep > 0) else slice(-columnStep if columnStep < 0 else None, None)
+
+    return (destinationRows, destinationColumns), (sourceRows, sourceColumns)
+
+# Pre-computes the slices for all 8 directions
+DirectionSlices = [_shiftSlices(rowStep, columnStep) + (cost,) for (rowStep, columnStep, cost) in Directions]
+
+# Grows every True cell in the mask by the given number of cells in all 8 directions
+def dilate(mask, cells):
+    grown = mask.copy()
+
+    for _ in range(0, cells):
+        previous = grown.copy()
+        for destination, source, _ in DirectionSlices:
+            grown[destination] |= previous[source]
+
+    return grown
+
+# Gets the length, in problem units, of a route with the given number of straight and 45 degree steps
+# The length is always worked out from the step counts so routes of the same shape have exactly the same length
+def getMeasure(straightSteps, diagonalSteps):
+    return (straightSteps * GridPitch) + (diagonalSteps * GridPitch * math.sqrt(2))
+
+# Gets the number of straight and 45 degree steps in the shortest route between two cells when there are no obstacles
+def octileSteps(firstCell, secondCell):
+    rowDistance = abs(firstCell[0] - secondCell[0])
+    columnDistance = abs(firstCell[1] - secondCell[1])
+
+    return max(rowDistance, columnDistance) - min(rowDistance, columnDistance), min(rowDistance, columnDistance)
+
+# endregion
+
+# region Routing State
+
+# Stores the wires that have been routed so far for a problem
+# This allows an ordering to be extended one connection at a time
+class RoutingState():
+
+    # Constructor that initialises an empty board
+    def __init__(self, occupied):
+        # Cells that can't be entered because a previous wire (or its clearance) is in them
+        self.occupied = occupied
+
+        # The connections routed so far, the number of straight and 45 degree steps in their wires
+        # and whether they were all routed
+        self.order = []
+        self.straightSteps = 0
+        self.diagonalSteps = 0
+        self.success = 1
+
+        # The lower bound of each connection worked out on this board, with the cells of a shortest route for it
+        # A bound stays the same while its route is still clear, so states made from this one keep using it
+        self.lowerBounds = {}
+
+    # Returns an independent copy of the state so it can be extended in a different way
+    # The bounds and their masks are never changed once they are made so the copy can share them
+    def copy(self):
+        newState = RoutingState(self.occupied.copy())
+        newState.order = list(self.order)
+        newState.straightSteps = self.straightSteps
+        newState.diagonalSteps = self.diagonalSteps
+        newState.success = self.success
+        newState.lowerBounds = dict(self.lowerBounds)
+
+        return newState
+
+    # Returns the result in the same format as the evaluate methods
+    def getResult(self):
+        return {'order': list(self.order), 'success': self.success, 'measure': getMeasure(self.straightSteps, self.diagonalSteps)}
+
+# endregion
+
+# region Problem Router
+
+# Routes the wires of a single problem on a grid where wires can move horizontally, vertically or at 45 degrees
+# The wavefront expansion is done with NumPy array shifts rather than a cell by cell search
+class ProblemRouter():
+
+    # region Constructor
+
+    # Constructor that sets up the grid and the pin locations of the problem
+    def __init__(self, problem):
+        self.problem = [tuple(point) for point in problem]
+        self.numberOfPoints = len(self.problem)
+
+        # Works out where the grid starts so that all the pins have a margin around them
+        xValues = [point[0] for point in self.problem] + [point[2] for point in self.problem]
+        yValues = [point[1] for point in self.problem] + [point[3] for point in self.problem]
+        self.originX = min(xValues)
+        self.originY = min(yValues)
+
+        # Gets the size of the grid
+        rows = int(round((max(yValues) - self.originY) / float(GridPitch))) + (2 * GridMargin) + 1
+        columns = int(round((max(xValues) - self.originX) / float(GridPitch))) + (2 * GridMargin) + 1
+        self.shape = (rows, columns)
+
+        # Gets the cells that the start and end pins of each connection are in
+        self.startCells = [self.__getCell(point[0], point[1]) for point in self.problem]
+        self.endCells = [self.__getCell(point[2], point[3]) for point in self.problem]
+
+        # Works out, for each connection, the cells that the other connections' pins block
+        self.pinBlocks = []
+        for connection in range(0, self.numberOfPoints):
+            pins = numpy.zeros(self.shape, dtype=bool)
+            for otherConnection in range(0, self.numberOfPoints):
+                if (otherConnection != connection):
+                    pins[self.startCells[otherConnection]] = True
+                    pins[self.endCells[otherConnection]] = True
+
+            self.pinBlocks.append(dilate(pins, ClearanceCells))
+
+    # Converts a problem coordinate into a grid cell
+    def __getCell(self, x, y):
+        row = int(round((y - self.originY) / float(GridPitch))) + GridMargin
+        column = int(round((x - self.originX) / float(GridPitch))) + GridMargin
+
+        return (row, column)
+
+    # endregion
+
+    # region Routing
+
+    # Returns a state with no wires routed
+    def getEmptyState(self):
+        return RoutingState(numpy.zeros(self.shape, dtype=bool))
+
+    # Routes the connection on top of the wires already in the state, updating the state in place
+    # Once a connection fails the state stays unsuccessful and no more wires are routed
+    def routeConnection(self, state, connection):
+        state.order.append(connection)
+
+        if (state.success == 0):
+            return state
+
+        # Gets the cells the wire can't go through
+        blocked = state.occupied | self.pinBlocks[connection]
+        source = self.startCells[connection]
+        target = self.endCells[connection]
+
+        if (blocked[source] or blocked[target]):
+            state.success = 0
+            return state
+
+        # Expands the wavefront from the source and gets the route back from the target
+        distances = self.__expandWavefront(blocked, source, target)
+        if (math.isinf(distances[target])):
+            state.success = 0
+            return state
+
+        path = self.__traceRoute(distances, target)
+
+        # Adds the wire, and its clearance, to the occupied cells
+        pathMask = numpy.zeros(self.shape, dtype=bool)
+        pathMask[tuple(numpy.array(path).T)] = True
+        wireMask = dilate(pathMask, ClearanceCells)
+        state.occupied |= wireMask
+
+        # Forgets the bounds whose routes go through the wire, the rest can't have changed
+        # Infinite bounds are kept as routing more wires can never unblock a connection
+        state.lowerBounds = {otherConnection: (bound, route) for otherConnection, (bound, route) in state.lowerBounds.items()
+                             if ((route is None) or (not wireMask[route].any()))}
+
+        # Adds the steps of the wire to the measure
+        for index in range(1, len(path)):
+            if ((path[index][0] != path[index - 1][0]) and (path[index][1] != path[index - 1][1])):
+                state.diagonalSteps += 1
+            else:
+                state.straightSteps += 1
+
+        return state
+
+    # Routes all the connections in the order and returns the result
+    def evaluate(self, order):
+        state = self.getEmptyState()
+        for connection in order:
+            self.routeConnection(state, connection)
+
+        return state.getResult()
+
+    # Routes each of the orders and returns the results in the same order as they were given
+    # The orders are routed in sorted order so that the wires of a shared prefix are only routed once
+    def evaluateMulti(self, orders):
+        results = [None] * len(orders)
+        sortedIndexes = sorted(range(0, len(orders)), key=lambda index: list(orders[index]))
+
+        # Stores the state after each connection of the last order that was routed
+        previousOrder = []
+        prefixStates = [self.getEmptyState()]
+
+        for index in sortedIndexes:
+            order = list(orders[index])
+
+            # Gets how many connections this order shares with the last one
+            sharedLength = 0
+            while ((sharedLength < min(len(order), len(previousOrder))) and (order[sharedLength] == previousOrder[sharedLength])):
+                sharedLength += 1
+
+            # Routes the rest of the connections on top of the shared prefix
+            del prefixStates[sharedLength + 1:]
+            for connection in order[sharedLength:]:
+                prefixStates.append(self.routeConnection(prefixStates[-1].copy(), connection))
+
+            results[index] = prefixStates[len(order)].getResult()
+            previousOrder = order
+
+        return results
+
+    # Gets the shortest distance from the source to every cell, stopping once the target can't get any shorter
+    def __expandWavefront(self, blocked, source, target):
+        distances = numpy.full(self.shape, numpy.inf)
+        distances[source] = 0
+        rows, columns = self.shape
+
+        # Bounds of the cells that changed in the last iteration
+        # Only cells next to these can change in the next iteration so only this window is relaxed
+        firstRow, lastRow, firstColumn, lastColumn = source[0], source[0], source[1], source[1]
+
+        while True:
+            # Gets the window, which covers the changed cells plus their neighbours and the neighbours' neighbours
+            rowStart = max(firstRow - 2, 0)
+            rowEnd = min(lastRow + 3, rows)
+            columnStart = max(firstColumn - 2, 0)
+            columnEnd = min(lastColumn + 3, columns)
+
+            window = distances[rowStart:rowEnd, columnStart:columnEnd]
+            previous = window.copy()
+
+            # Relaxes every cell against its neighbour in each of the 8 directions
+            for destination, sourceSlice, cost in DirectionSlices:
+                numpy.minimum(window[destination], previous[sourceSlice] + cost, out=window[destination])
+
+            window[blocked[rowStart:rowEnd, columnStart:columnEnd]] = numpy.inf
+
+            # Stops when nothing changed or when every changed cell is already further than the target
+            improved = window < previous
+            changedRows = numpy.flatnonzero(improved.any(axis=1))
+            if (len(changedRows) == 0):
+                break
+            if ((not math.isinf(distances[target])) and (window[improved].min() >= distances[target])):
+                break
+
+            # Moves the window to the cells that changed
+            changedColumns = numpy.flatnonzero(improved.any(axis=0))
+            firstRow, lastRow = rowStart + changedRows[0], rowStart + changedRows[-1]
+            firstColumn, lastColumn = columnStart + changedColumns[0], columnStart + changedColumns[-1]
+
+        return distances
+
+    # Walks back from the target to the source along the shortest distances
+    def __traceRoute(self, distances, target):
+        path = [target]
+        current = target
+        rows, columns = self.shape
+
+        while (distances[current] > 0):
+            bestCell = None
+            bestDistance = distances[current]
+
+            for rowStep, columnStep, cost in Directions:
+                row = current[0] + rowStep
+                column = current[1] + columnStep
+
+                if ((0 <= row < rows) and (0 <= column < columns)):
+                    # Only steps that lie on a shortest route are considered
+                    if ((distances[row, column] + cost <= distances[current] + 1e-9) and (distances[row, column] < bestDistance)):
+                        bestCell = (row, column)
+                        bestDistance = distances[row, column]
+
+            path.append(bestCell)
+            current = bestCell
+
+        return path
+
+    # endregion
+
+    # region Bounds
+
+    # Gets the shortest length the connection could possibly be routed with
+    def getLowerBound(self, connection):
+        return getMeasure(*octileSteps(self.startCells[connection], self.endCells[connection]))
+
+    # Gets the shortest length the connection could be routed with on top of the wires in the state
+    # Routing more wires can only block more cells so the connection can never be shorter than this later on
+    # Returns infinity if the connection can't be routed on the board
+    # The bound is kept in the state, along with the cells of a shortest route, as the bound can't change while
+    # that route is still clear
+    def getStateLowerBound(self, state, connection):
+        if (state.success == 0):
+            return math.inf
+
+        if (connection not in state.lowerBounds):
+            blocked = state.occupied | self.pinBlocks[connection]
+            source = self.startCells[connection]
+            target = self.endCells[connection]
+
+            if (blocked[source] or blocked[target]):
+                state.lowerBounds[connection] = (math.inf, None)
+            else:
+                distances = self.__expandWavefront(blocked, source, target)
+                if (math.isinf(distances[target])):
+                    state.lowerBounds[connection] = (math.inf, None)
+                else:
+                    route = tuple(numpy.array(self.__traceRoute(distances, target)).T)
+                    state.lowerBounds[connection] = (float(distances[target]) * GridPitch, route)
+
+        return state.lowerBounds[connection][0]
+
+    # endregion
+
+# endregion
+
+# region Router Version
+
+# Gets the version of the routing along with the grid settings, which all change the results of routing a problem
+def getRouterVersion():
+    return "-".join(str(value) for value in (RouterVersion, GridPitch, GridMargin, ClearanceCells))
+
+# endregion
+
+# region Problem Generation
+
+# Generates a list of random valid problems with the first pins in one square and the second pins in another
+# The generator can be a seed or a NumPy generator, and an unseeded one is used if it isn't given
+def getProblems(numberOfProblems, numberOfPoints, squareSize=DefaultSquareSize, generator=None):
+    return [utilities.getProblemList(problemArray) for problemArray in utilities.generateProblems(numberOfProblems, numberOfPoints, squareSize, generator)]
+
+# Generates a random valid problem in the same way as getProblems
+def getProblem(numberOfPoints, squareSize=DefaultSquareSize, generator=None):
+    return getProblems(1, numberOfPoints, squareSize, generator)[0]
+
+# endregion
@@ -0,0 +1,129 @@
+import json
+import os
+import numpy
+import bruteForce
+import evaluator
+import utilities
+
+# region Constants
+
+# Version of the corpus format, increased whenever the files change
+CorpusVersion = 1
+
+# Names of the files that make up a corpus directory
+HeaderFile = "header.json"
+ProblemsFile = "problems.npy"
+OrdersFile = "orders.npy"
+MeasuresFile = "measures.npy"
+SuccessesFile = "successes.npy"
+
+# endregion
+
+# region Build
+
+# Builds a corpus of valid, solvable problems along with their optimal orderings
+# The problems are made in the same way as the ones the agents learn with, so a squareSize of 0 gives the backend's problems
+# The arrays are written straight into memory mapped files so the corpus never has to fit in memory
+def buildCorpus(path, numberOfProblems, numberOfPoints, squareSize, seed=None, numberOfWorkers=1):
+    os.makedirs(path, exist_ok=True)
+    evaluator.seedProblems(seed)
+
+    # Creates the files that the problems and their solutions will be written into
+    problems = numpy.lib.format.open_memmap(os.path.join(path, ProblemsFile), mode="w+", dtype=numpy.int32, shape=(numberOfProblems, numberOfPoints, 4))
+    orders = numpy.lib.format.open_memmap(os.path.join(path, OrdersFile), mode="w+", dtype=numpy.int16, shape=(numberOfProblems, numberOfPoints))
+    measures = numpy.lib.format.open_memmap(os.path.join(path, MeasuresFile), mode="w+", dtype=numpy.float64, shape=(numberOfProblems,))
+    successes = numpy.lib.format.open_memmap(os.path.join(path, SuccessesFile), mode="w+", dtype=numpy.int8, shape=(numberOfProblems,))
+
+    problemNumber = 0
+    for problem in evaluator.iterateProblems(numberOfPoints, squareSize):
+        # Gets the optimal solution, ignoring the problem if it can't be solved
+        bestOrder, success, bestReward = bruteForce.getSolution(problem, numberOfWorkers)
+        if (success == 0):
+            continue
+
+        problems[problemNumber] = problem
+        orders[problemNumber] = bestOrder
+        measures[problemNumber] = (utilities.MaxRewardPerPoint * numberOfPoints) - bestReward
+        successes[problemNumber] = success
+
+        problemNumber += 1
+        utilities.outputPercentageComplete(problemNumber, numberOfProblems, 0)
+
+        if (problemNumber == numberOfProblems):
+            break
+
+    # Makes sure everything is written to disk
+    for array in (problems, orders, measures, successes):
+        array.flush()
+
+    # Writes the header last so a corpus that was only partly built can't be read
+    header = {'version': CorpusVersion, 'numberOfProblems': numberOfProblems, 'numberOfPoints': numberOfPoints,
+              'squareSize': squareSize, 'backend': evaluator.getBackendName()}
+    with open(os.path.join(path, HeaderFile), "w") as headerFile:
+        json.dump(header, headerFile)
+
+# endregion
+
+# region Read
+
+# Reads a corpus of problems and their optimal solutions without loading it into memory
+# Each problem is returned as (problem, order, success, reward) where reward is the optimal reward
+class ProblemCorpus():
+
+    # Constructor that checks the header and memory maps the arrays
+    def __init__(self, path):
+        with open(os.path.join(path, HeaderFile)) as headerFile:
+            self.header = json.load(headerFile)
+
+        if (self.header['version'] != CorpusVersion):
+            raise ValueError("Unsupported corpus version: " + str(self.header['version']))
+
+        self.numberOfPoints = self.header['numberOfPoints']
+        self.squareSize = self.header['squareSize']
+        self.backend = self.header['backend']
+
+        self.problems = numpy.load(os.path.join(path, ProblemsFile), mmap_mode="r")
+        self.orders = numpy.load(os.path.join(path, OrdersFile), mmap_mode="r")
+        self.measures = numpy.load(os.path.join(path, MeasuresFile), mmap_mode="r")
+        self.successes = numpy.load(os.path.join(path, SuccessesFile), mmap_mode="r")
+
+    # Checks that the corpus was built with the number of points, square size and backend it's about to be used with
+    # Raises a ValueError naming every setting that is different, as the problems would come from another distribution
+    def checkSettings(self, numberOfPoints, squareSize, backend):
+        differences = [name + " " + str(corpusValue) + " rather than " + str(value) for name, corpusValue, value in
+                       (("number of points", self.numberOfPoints, numberOfPoints), ("square size", self.squareSize, squareSize),
+                        ("backend", self.backend, backend)) if (corpusValue != value)]
+
+        if (len(differences) > 0):
+            raise ValueError("The corpus was built with " + ", ".join(differences))
+
+    def __len__(self):
+        return len(self.problems)
+
+    def __getitem__(self, index):
+        problem = utilities.getProblemList(self.problems[index])
+        order = self.orders[index].tolist()
+        reward = (utilities.MaxRewardPerPoint * self.numberOfPoints) - float(self.measures[index])
+
+        return problem, order, int(self.successes[index]), reward
+
+    def __iter__(self):
+        for index in range(0, len(self)):
+            yield self[index]
+
+# endregion
+
+# region Builder Command
+
+if (__name__ == "__main__"):
+    corpusPath = input("Please input the directory to write the corpus to: ")
+    corpusProblems = int(input("Please input the number of problems in the corpus: "))
+    corpusPoints = int(input("Please input the number of points to connect: "))
+    corpusSquareSize = int(input("Please input the square side length the coordinates are in (0 for the backend's problems): "))
+    corpusSeed = int(input("Please input the random seed: "))
+    corpusWorkers = int(input("Please input the number of processes to use for the brute force solutions: "))
+
+    buildCorpus(corpusPath, corpusProblems, corpusPoints, corpusSquareSize, corpusSeed, corpusWorkers)
+    print("Corpus Finished")
+
+# endregion
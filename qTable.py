@@ -0,0 +1,375 @@
+import contextlib
+import numpy
+
+# region Constants
+
+# Number of states the table has space for when it is created
+InitialCapacity = 1024
+
+# endregion
+
+# region Q-Table
+
+# Stores the values the Q-Learning agent has learnt for every state it has seen
+# Each value is kept in its own NumPy array with one row per state and one column per action, so every state
+# uses the same amount of memory and choosing an action is a vectorised argmax over a row rather than a Python loop
+# The rows are in the same order as the states of the state index, so a state's index is also its row
+class QTable():
+
+    # Constructor that allocates the empty arrays
+    def __init__(self, numberOfActions, capacity=InitialCapacity):
+        self.numberOfActions = numberOfActions
+        self.numberOfStates = 0
+
+        # Whether each action can be done in the state, which is False for the actions already in the ordering
+        self.valid = numpy.zeros((capacity, numberOfActions), dtype=bool)
+
+        # Whether the action can lead to a successful ordering, and the two estimates of its reward
+        self.success = numpy.zeros((capacity, numberOfActions), dtype=numpy.int8)
+        self.rewards1 = numpy.zeros((capacity, numberOfActions))
+        self.rewards2 = numpy.zeros((capacity, numberOfActions))
+
+        # The uncertainty of each estimate
+        self.uncertainty1 = numpy.zeros((capacity, numberOfActions))
+        self.uncertainty2 = numpy.zeros((capacity, numberOfActions))
+
+        # The rewards that have been added up, and the number of times seen, since each estimate was last updated
+        self.tempReward1 = numpy.zeros((capacity, numberOfActions))
+        self.tempReward2 = numpy.zeros((capacity, numberOfActions))
+        self.timesSeen1 = numpy.zeros((capacity, numberOfActions), dtype=numpy.int32)
+        self.timesSeen2 = numpy.zeros((capacity, numberOfActions), dtype=numpy.int32)
+
+        # Running aggregates of each row, which the set methods keep up to date so that using the values of the next
+        # state in an update doesn't scan its row
+        # The valid action with the highest reward in each estimate (the first when there's a tie), the sum of the
+        # uncertainties of the valid actions in each estimate, and the number of valid and of valid successful actions
+        self.bestAction1 = numpy.zeros(capacity, dtype=numpy.int32)
+        self.bestAction2 = numpy.zeros(capacity, dtype=numpy.int32)
+        self.uncertaintySum1 = numpy.zeros(capacity)
+        self.uncertaintySum2 = numpy.zeros(capacity)
+        self.validCount = numpy.zeros(capacity, dtype=numpy.int32)
+        self.successCount = numpy.zeros(capacity, dtype=numpy.int32)
+
+    # region States
+
+    # Names of the arrays that have one row per state
+    ArrayNames = ('valid', 'success', 'rewards1', 'rewards2', 'uncertainty1', 'uncertainty2',
+                  'tempReward1', 'tempReward2', 'timesSeen1', 'timesSeen2')
+
+    # Names of the arrays that hold estimates, where the changes made by different learners are averaged,
+    # and of the arrays that hold totals, where the changes made by different learners are added together
+    EstimateArrayNames = ('success', 'rewards1', 'rewards2', 'uncertainty1', 'uncertainty2')
+    TotalArrayNames = ('tempReward1', 'tempReward2', 'timesSeen1', 'timesSeen2')
+
+    # Names of the arrays of running aggregates, which have one value per state and aren't saved as they can be worked out
+    AggregateArrayNames = ('bestAction1', 'bestAction2', 'uncertaintySum1', 'uncertaintySum2', 'validCount', 'successCount')
+
+    # Adds the row for a state where the actions in the order have already been done and returns its index
+    # Every other action starts as successful with a reward of 0 and an uncertainty of 1
+    def addState(self, order):
+        if (self.numberOfStates == len(self.valid)):
+            self.__grow()
+
+        state = self.numberOfStates
+        self.numberOfStates += 1
+        self.initialiseState(state, order)
+
+        return state
+
+    # Sets the row of the state to the starting values, where the actions in the order have already been done
+    def initialiseState(self, state, order):
+        self.valid[state] = True
+        self.valid[state, list(order)] = False
+        self.success[state] = self.valid[state]
+        self.uncertainty1[state] = self.valid[state]
+        self.uncertainty2[state] = self.valid[state]
+        self.updateAggregates(state)
+
+    # Works out the running aggregates of the rows from their values
+    # Used when whole rows have been changed rather than single values
+    def updateAggregates(self, rows):
+        valid = self.valid[rows]
+
+        self.bestAction1[rows] = numpy.where(valid, self.rewards1[rows], -numpy.inf).argmax(axis=-1)
+        self.bestAction2[rows] = numpy.where(valid, self.rewards2[rows], -numpy.inf).argmax(axis=-1)
+        self.uncertaintySum1[rows] = numpy.where(valid, self.uncertainty1[rows], 0).sum(axis=-1)
+        self.uncertaintySum2[rows] = numpy.where(valid, self.uncertainty2[rows], 0).sum(axis=-1)
+        self.validCount[rows] = valid.sum(axis=-1)
+        self.successCount[rows] = (valid & (self.success[rows] == 1)).sum(axis=-1)
+
+    # Doubles the number of states the arrays have space for
+    def __grow(self):
+        for name in QTable.ArrayNames + QTable.AggregateArrayNames:
+            array = getattr(self, name)
+            grownArray = numpy.zeros((max(2 * len(array), InitialCapacity),) + array.shape[1:], dtype=array.dtype)
+            grownArray[:len(array)] = array
+            setattr(self, name, grownArray)
+
+    # Returns the number of states in the table
+    def getNumberOfStates(self):
+        return self.numberOfStates
+
+    # Gets the lock that has to be held while the row of the state is changed
+    # Only this process uses the table so no lock is needed
+    def getLock(self, state):
+        return contextlib.nullcontext()
+
+    # endregion
+
+    # region Merge
+
+    # Gets the values of the rows so the changes made to them can be merged into another table
+    def getRows(self, rows):
+        return {name: getattr(self, name)[rows] for name in QTable.ArrayNames}
+
+    # Sets the rows to the values from another table's getRows, adding the rows that aren't in the table yet
+    def setRows(self, rows, rowValues):
+        if (len(rows) > 0):
+            while (int(rows.max()) >= len(self.valid)):
+                self.__grow()
+
+            self.numberOfStates = max(self.numberOfStates, int(rows.max()) + 1)
+
+        for name in QTable.ArrayNames:
+            getattr(self, name)[rows] = rowValues[name]
+
+        self.updateAggregates(rows)
+
+    # Removes the rows from firstState onwards so the rows of another table can be set in their place
+    def removeStatesFrom(self, firstState):
+        self.numberOfStates = firstState
+
+    # Gets how much the values in the rows of another table differ from the same rows of this table
+    def getDeltas(self, rows, rowValues):
+        return {name: rowValues[name].astype(float) - getattr(self, name)[rows]
+                for name in QTable.EstimateArrayNames + QTable.TotalArrayNames}
+
+    # Adds the changes that several learners made to the table
+    # Each learner's changes are given as the rows they changed and the deltas from getDeltas
+    # Changes to an estimate are averaged over the learners that changed it and changes to a total are added together
+    # The counters are then limited so they can still reach requiredTimesSeen, keeping the average temporary reward
+    def mergeDeltas(self, rowsList, deltasList, requiredTimesSeen):
+        if (len(rowsList) == 0):
+            return
+
+        allRows = numpy.concatenate(rowsList)
+        rows, positions = numpy.unique(allRows, return_inverse=True)
+
+        for name in QTable.EstimateArrayNames + QTable.TotalArrayNames:
+            deltas = numpy.concatenate([deltas[name] for deltas in deltasList])
+
+            totals = numpy.zeros((len(rows), self.numberOfActions))
+            numpy.add.at(totals, positions, deltas)
+
+            if (name in QTable.EstimateArrayNames):
+                counts = numpy.zeros((len(rows), self.numberOfActions))
+                numpy.add.at(counts, positions, deltas != 0)
+                totals /= numpy.maximum(counts, 1)
+
+            values = getattr(self, name)[rows] + totals
+            if (name == 'success'):
+                values = numpy.clip(numpy.rint(values), 0, 1)
+
+            getattr(self, name)[rows] = values
+
+        # Limits the counters, scaling the temporary rewards so their averages stay the same
+        for timesSeen, tempReward in ((self.timesSeen1, self.tempReward1), (self.timesSeen2, self.tempReward2)):
+            counters = timesSeen[rows]
+            rewards = tempReward[rows]
+
+            limited = numpy.clip(counters, 0, requiredTimesSeen - 1)
+            rewards = numpy.where(counters > 0, rewards * (limited / numpy.maximum(counters, 1)), 0)
+
+            timesSeen[rows] = limited
+            tempReward[rows] = rewards
+
+        self.updateAggregates(rows)
+
+    # endregion
+
+    # region Save and Load
+
+    # Gets the rows of the table that are in use so they can be saved
+    def getArrays(self):
+        return {name: getattr(self, name)[:self.numberOfStates] for name in QTable.ArrayNames}
+
+    # Replaces the table with the rows stored in the arrays
+    def setArrays(self, arrays):
+        for name in QTable.ArrayNames:
+            setattr(self, name, numpy.array(arrays[name], dtype=getattr(self, name).dtype))
+
+        self.numberOfStates = len(self.valid)
+
+        for name in QTable.AggregateArrayNames:
+            setattr(self, name, numpy.zeros(self.numberOfStates, dtype=getattr(self, name).dtype))
+        self.updateAggregates(slice(0, self.numberOfStates))
+
+    # endregion
+
+    # region Set Values
+
+    # Sets whether the action can lead to a successful ordering in the state
+    # The action has to be valid in the state, as with the other set methods
+    def setSuccess(self, state, action, value):
+        self.successCount[state] += int(value == 1) - int(self.success[state, action] == 1)
+        self.success[state, action] = value
+
+    # Sets the reward of the action in the state for one of the estimates
+    # The row is only scanned when the reward of the best action goes down, as another action might then be the best
+    def setReward(self, state, action, estimate, value):
+        rewards, bestActions = (self.rewards1, self.bestAction1) if (estimate == 1) else (self.rewards2, self.bestAction2)
+
+        oldValue = rewards[state, action]
+        rewards[state, action] = value
+
+        bestAction = bestActions[state]
+        if (action == bestAction):
+            if (value < oldValue):
+                bestActions[state] = numpy.where(self.valid[state], rewards[state], -numpy.inf).argmax()
+        elif ((value > rewards[state, bestAction]) or ((value == rewards[state, bestAction]) and (action < bestAction))):
+            bestActions[state] = action
+
+    # Sets the uncertainty of the action in the state for one of the estimates
+    def setUncertainty(self, state, action, estimate, value):
+        uncertainty, uncertaintySums = (self.uncertainty1, self.uncertaintySum1) if (estimate == 1) else (self.uncertainty2, self.uncertaintySum2)
+
+        uncertaintySums[state] += value - uncertainty[state, action]
+        uncertainty[state, action] = value
+
+    # Sets whether each of the actions can lead to a successful ordering in the state at the same position
+    # Each state and action can only be given once, as with the other batch set methods
+    def setSuccesses(self, rows, columns, values):
+        numpy.add.at(self.successCount, rows, (numpy.asarray(values) == 1).astype(numpy.int32) - (self.success[rows, columns] == 1))
+        self.success[rows, columns] = values
+
+    # Sets the reward of each of the actions in the state at the same position for one of the estimates
+    # Several actions of a row can change at once, so the best actions of the rows are found again
+    def setRewards(self, rows, columns, estimate, values):
+        rewards, bestActions = (self.rewards1, self.bestAction1) if (estimate == 1) else (self.rewards2, self.bestAction2)
+
+        rewards[rows, columns] = values
+
+        changedRows = numpy.unique(rows)
+        bestActions[changedRows] = numpy.where(self.valid[changedRows], rewards[changedRows], -numpy.inf).argmax(axis=1)
+
+    # Sets the uncertainty of each of the actions in the state at the same position for one of the estimates
+    def setUncertainties(self, rows, columns, estimate, values):
+        uncertainty, uncertaintySums = (self.uncertainty1, self.uncertaintySum1) if (estimate == 1) else (self.uncertainty2, self.uncertaintySum2)
+
+        numpy.add.at(uncertaintySums, rows, values - uncertainty[rows, columns])
+        uncertainty[rows, columns] = values
+
+    # endregion
+
+    # region Action Selection
+
+    # Gets the actions to try when learning, which are the successful actions with the highest expected reward
+    # plus a share of the maximum reward based on how uncertain they are, so that uncertain actions get explored
+    # Returns an empty array if none of the actions are successful
+    def getExplorationActions(self, state, maxReward):
+        expectedReward = (self.rewards1[state] + self.rewards2[state]) / 2
+        expectedReward = expectedReward + (maxReward * ((self.uncertainty1[state] + self.uncertainty2[state]) / 2))
+
+        successful = self.valid[state] & (self.success[state] == 1)
+        if (not successful.any()):
+            return numpy.flatnonzero(successful)
+
+        return numpy.flatnonzero(successful & (expectedReward == expectedReward[successful].max()))
+
+    # Gets which actions getExplorationActions would return for each of the states at once, as a row of booleans per state
+    # The rows of the states where none of the actions are successful are all False
+    def getExplorationMasks(self, rows, maxReward):
+        expectedReward = (self.rewards1[rows] + self.rewards2[rows]) / 2
+        expectedReward = expectedReward + (maxReward * ((self.uncertainty1[rows] + self.uncertainty2[rows]) / 2))
+
+        successful = self.valid[rows] & (self.success[rows] == 1)
+        expectedReward[~successful] = -numpy.inf
+
+        return successful & (expectedReward == expectedReward.max(axis=1, keepdims=True))
+
+    # Gets the successful action with the highest expected reward, or -1 if none are successful
+    # The first action is returned when more than one has the highest reward
+    def getGreedyAction(self, state):
+        expectedReward = (self.rewards1[state] + self.rewards2[state]) / 2
+        expectedReward[~(self.valid[state] & (self.success[state] == 1))] = -numpy.inf
+
+        action = int(expectedReward.argmax())
+        return action if (expectedReward[action] > -1) else -1
+
+    # Gets the greedy action of each of the states at once, with -1 for the states where none are successful
+    # If no states are given then the greedy action of every state in the table is returned
+    def getGreedyActions(self, rows=None):
+        if (rows is None):
+            rows = slice(0, self.numberOfStates)
+
+        expectedReward = (self.rewards1[rows] + self.rewards2[rows]) / 2
+        expectedReward[~(self.valid[rows] & (self.success[rows] == 1))] = -numpy.inf
+
+        actions = expectedReward.argmax(axis=1)
+        return numpy.where(expectedReward[numpy.arange(0, len(actions)), actions] > -1, actions, -1)
+
+    # endregion
+
+    # region Next State Values
+
+    # Gets the expected future reward of the state, using the action that is best in one estimate
+    # and its reward in the other estimate so that the maximum isn't biased upwards
+    def getExpectedFutureReward(self, state, estimate):
+        if (state == -1):
+            # State not seen before so return 0
+            return 0
+
+        bestActions, valueRewards = (self.bestAction2, self.rewards1) if (estimate == 1) else (self.bestAction1, self.rewards2)
+        return valueRewards[state, bestActions[state]]
+
+    # Gets whether the state has at least 1 action that could lead to a successful ordering
+    def getNextSuccess(self, state):
+        if (state == -1):
+            # State not seen so presume success
+            return 1
+
+        return int(self.successCount[state] > 0)
+
+    # Gets the average uncertainty of the actions in the state
+    def getUncertainty(self, state, estimate):
+        if (state == -1):
+            # State not seen so uncertainty is 1
+            return 1
+
+        uncertaintySums = self.uncertaintySum1 if (estimate == 1) else self.uncertaintySum2
+        return float(uncertaintySums[state] / self.validCount[state])
+
+    # Gets the expected future reward of each of the states at once, with 0 for the states that haven't been seen
+    def getExpectedFutureRewards(self, states, estimate):
+        rewards = numpy.zeros(len(states))
+        seen = states != -1
+        rows = states[seen]
+
+        bestActions, valueRewards = (self.bestAction2, self.rewards1) if (estimate == 1) else (self.bestAction1, self.rewards2)
+
+        rewards[seen] = valueRewards[rows, bestActions[rows]]
+        return rewards
+
+    # Gets whether each of the states has at least 1 action that could lead to a successful ordering, with 1 for the
+    # states that haven't been seen
+    def getNextSuccesses(self, states):
+        successes = numpy.ones(len(states), dtype=numpy.int64)
+        seen = states != -1
+        rows = states[seen]
+
+        successes[seen] = self.successCount[rows] > 0
+        return successes
+
+    # Gets the average uncertainty of the actions in each of the states, with 1 for the states that haven't been seen
+    def getUncertainties(self, states, estimate):
+        uncertainties = numpy.ones(len(states))
+        seen = states != -1
+        rows = states[seen]
+
+        uncertaintySums = self.uncertaintySum1 if (estimate == 1) else self.uncertaintySum2
+        uncertainties[seen] = uncertaintySums[rows] / self.validCount[rows]
+        return uncertainties
+
+    # endregion
+
+# endregion
@@ -1,10 +1,39 @@
 import numpy
+import os
 import random
-import copt
+import tempfile
+import evaluator
 import abc
 import heuristics
 import utilities
 import threading
+import scheduler
+import stateIndex
+import qTable
+import sharedQTable
+import transitionStore
+
+# region Constants
+
+# Version of the saved agent format, increased whenever the saved arrays change
+AgentFormatVersion = 1
+
+# Number of threads problems are learnt on when learning in a single process without a seed
+# The threads share the agent's tables so they spend most of their time routing, which NumPy can do in parallel
+# The order the threads update the tables in changes from run to run, so learning on them isn't repeatable
+LearningThreads = 4
+
+# Number of problems each worker process learns from before its changes are merged when learning in parallel
+DefaultMergeInterval = 16
+
+# Number of seconds a worker process is given to stop after learning in parallel before it is terminated
+WorkerStopTimeout = 10
+
+# Names of the constants that are saved with the agent
+SavedConstantNames = ('points', 'roundNumber', 'reduceSymmetry', 'alpha', 'gamma', 'epsilon', 'minChange',
+                      'requiredTimesSeen', 'reseenProblems')
+
+# endregion
 
 # region Base Class
 
@@ -33,17 +62,12 @@ class QLearningAgent(BaseRLAgent):
     # region Constructor
 
     # Constructor that initialises all the arrays and constants
-    def __init__(self, numberOfPoints, numberToRound):
-        # Initialises the Q-Learning dictionary/action space
-        self.problems = {}
-        self.actions = []
-        self.success = []
-        self.rewards1 = []
-        self.rewards2 = []
-
-        # Initialises two array that stores the uncertainty of the action
-        self.actionUncertainty1 = []
-        self.actionUncertainty2 = []
+    # If reduceSymmetry is True then problems that are translations or mirror images of each other share their states
+    def __init__(self, numberOfPoints, numberToRound, reduceSymmetry=False):
+        # Initialises the index of the seen states and the Q-Table that stores the action space
+        # The index of a state is its row in the Q-Table
+        self.stateIndex = stateIndex.StateIndex(numberOfPoints)
+        self.qTable = qTable.QTable(numberOfPoints)
 
         # Initialises the number of points that need to be connected
         self.points = numberOfPoints
@@ -56,8 +80,9 @@ class QLearningAgent(BaseRLAgent):
         # Initialises epsilon, the chance a random action is chosen in action for the agent to learn
         self.epsilon = 0.1
 
-        # Initialises the number to round to
+        # Initialises the number to round to and whether symmetric problems share states
         self.roundNumber = numberToRound
+        self.reduceSymmetry = reduceSymmetry
 
         # Initialises the reseen problem counter
         self.reseenProblems = 0
@@ -70,11 +95,25 @@ class QLearningAgent(BaseRLAgent):
         self.minChange = 0.7
         self.requiredTimesSeen = 3
 
-        # Initialises the counters and temporary reward arrays
-        self.timesSeen1 = []
-        self.timesSeen2 = []
-        self.tempReward1 = []
-        self.tempReward2 = []
+        # Initialises the set of states whose rows have changed, which is only recorded when learning in a worker process
+        self.changedStates = None
+
+        # Initialises the number of stored transitions replayed after each action when learning, and the store of them
+        self.planningSteps = 0
+        self.transitionStore = transitionStore.TransitionStore()
+
+        # Initialises the lock that is held while the tables are read or changed, as problems are learnt on several threads
+        self.lock = threading.Lock()
+
+    # Locks can't be copied to other processes so a new one is made instead
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
 
     # endregion
 
@@ -83,23 +122,32 @@ class QLearningAgent(BaseRLAgent):
     # Takes in a problem and learns from the actions it takes in it
     def __learnProblem(self, learnProblem, index):
         # Gets the permuted problem and the permutation
-        permutedProblem, _ = self.__permuteProblem(learnProblem)
+        permutedProblem, _, problemKey = self.__permuteProblem(learnProblem)
+
+        # Gets the ID of the problem and the state of the empty ordering
+        with self.lock:
+            problemId = self.stateIndex.internProblem(problemKey)
+            state = self.stateIndex.findState(problemId, [])
 
         # Stores the current points ordering
         currentOrder = []
 
+        # Opens a session so each action only needs the new connection routing
+        session = evaluator.openSession(permutedProblem)
+
         for point in range(0, self.points):
             # Need to get the next action a maximum of self.points times
             # If an action is unsuccessful then can break from this loop
 
             # Gets the next action
-            nextAction = self.__getNextLearnAction(permutedProblem, currentOrder)
+            with self.lock:
+                nextAction = self.__getNextLearnAction(state, permutedProblem, currentOrder)
 
             # Updates the ordering
             newOrder = currentOrder + [nextAction]
 
-            # Check to see how well the random action has done
-            result = copt.evaluate(permutedProblem, newOrder)
+            # Check to see how well the action has done
+            result = session.extend(nextAction)
 
             # Get the reward and success
             # Does 100000 - reward so that we can use the conventional Q-Learning algorithm
@@ -111,8 +159,12 @@ class QLearningAgent(BaseRLAgent):
             if (success == 0):
                 reward = 0
 
-            # Update the arrays
-            self.__updateArrays(permutedProblem, currentOrder, nextAction, success, reward)
+            # Update the arrays, and replay stored transitions if the agent is planning
+            with self.lock:
+                state = self.__updateArrays(problemId, state, currentOrder, nextAction, success, reward)
+                if (self.planningSteps > 0):
+                    self.__planStep(state, nextAction, reward, success, len(newOrder) == self.points)
+                state = self.stateIndex.getChild(state, nextAction)
 
             # Update the current order
             currentOrder = newOrder
@@ -128,91 +180,376 @@ class QLearningAgent(BaseRLAgent):
         self.learnSuccesses[index] = 1
 
     # Allows the agent to learn using the specified number of problems
-    def learn(self, numberOfProblems, squareSize):
+    # With more than 1 worker the problems are learnt in parallel by worker processes, which either merge their changes
+    # every mergeInterval problems (see __learnParallel) or, if shareTable is True, share the Q-Table (see __learnShared)
+    # With 1 worker the problems are learnt on LearningThreads threads, which isn't repeatable, unless a seed is given,
+    # in which case they are learnt one after another so the same seed always gives the same agent
+    # With 1 worker and a batchSize above 1 each thread learns from batchSize problems at once (see __learnBatch)
+    # With planningSteps above 0 the agent replays that many stored transitions after each action (see __planStep)
+    def learn(self, numberOfProblems, squareSize, numberOfWorkers=1, mergeInterval=DefaultMergeInterval, seed=None, shareTable=False,
+              batchSize=1, planningSteps=0):
         print("Learning Started")
 
+        self.planningSteps = planningSteps
+
+        # Seeds the random numbers and the problems so learning with the same seed gives the same agent
+        if (seed is not None):
+            random.seed(seed)
+            evaluator.seedProblems(seed)
+
         if (numberOfProblems <= 0):
             print("Learning Finished")
             return
 
-        for i in range(0, numberOfProblems):
-            validProblem = False
+        if (numberOfWorkers > 1):
+            if (shareTable):
+                self.__learnShared(numberOfProblems, squareSize, numberOfWorkers, mergeInterval, seed)
+            else:
+                self.__learnParallel(numberOfProblems, squareSize, numberOfWorkers, mergeInterval, seed)
+            print("Learning Finished")
+            return
+
+        # Number of problems in each task and the number of problems finished
+        taskSizes = []
+        completedProblems = 0
 
-            # Makes sure the problem is valid
-            while (validProblem is False):
-                # Get the problem
-                problem = copt.getProblem(self.points) if squareSize == 0 else utilities.generateSmallerProblem(self.points, squareSize)
+        # Prints how far through the learning is each time a problem is finished
+        def outputProgress(taskNumber, result):
+            nonlocal completedProblems
 
-                # Checks whether the problem is valid
-                validProblem = utilities.checkValidProblem(problem) if squareSize == 0 else True
+            for _ in range(0, taskSizes[taskNumber]):
+                completedProblems += 1
+                utilities.outputPercentageComplete(completedProblems, numberOfProblems, self.reseenProblems)
 
-            # Add an index to the reward and success arrays
-            self.learnRewards.append(0)
-            self.learnSuccesses.append(0)
+        # The problems are made in batches on this thread as they are needed
+        problemSource = evaluator.iterateProblems(self.points, squareSize, numberOfProblems)
+
+        # Learns the problems on a pool of threads, where getting the next problem waits while the pool is busy
+        # With a seed the problems are learnt one after another on this thread instead, so the agent is always the same
+        with scheduler.Scheduler(LearningThreads if (seed is None) else 0, outputProgress) as learnScheduler:
+            for problemNumber in range(0, numberOfProblems, batchSize):
+                # Get the problems
+                problems = [next(problemSource) for _ in range(0, min(batchSize, numberOfProblems - problemNumber))]
+                taskSizes.append(len(problems))
 
-            # Create and start the threads
-            thread = threading.Thread(target=self.__learnProblem, args=(problem, len(self.learnRewards) - 1))
-            thread.start()
+                # Add indexes to the reward and success arrays
+                index = len(self.learnRewards)
+                self.learnRewards.extend([0] * len(problems))
+                self.learnSuccesses.extend([0] * len(problems))
 
-            outputThread = threading.Thread(target=utilities.outputPercentageComplete, args=(i + 1, numberOfProblems, self.reseenProblems,))
-            outputThread.start()
+                if (len(problems) == 1):
+                    learnScheduler.submit(self.__learnProblem, problems[0], index)
+                else:
+                    learnScheduler.submit(self.__learnBatch, problems, index)
 
-        while (thread.is_alive() or outputThread.is_alive()):
-            # Waits for all threads to be completed
-            pass
+            # Waits for all the problems to be learnt
+            learnScheduler.join()
 
         print("Learning Finished")
 
     # Gets the next action when the agent is learning
-    def __getNextLearnAction(self, problem, order):
-        # Sets up the problem data to be how all problem data is stored
-        problemData = str(problem + [order])
-
+    def __getNextLearnAction(self, state, problem, order):
         # Checks to see if the problem has already been seen
+        if (state != -1):
+            # Want to find the action that is a combination of the one that gives the best reward
+            # and the one that will allow the agent to learn a lot
+            # Once the agent has learnt for a while, the uncertainty ~= 0 so the best action is always chosen
+            optimalNextActions = self.qTable.getExplorationActions(state, utilities.MaxRewardPerPoint * (len(order)+2))
+
+            # Checks if a valid ordering was found
+            if (len(optimalNextActions) == 0):
+                # No optimal action found so just return a random one
+                return heuristics.RandomHeuristic().getNextAction(problem, order)
+            elif (len(optimalNextActions) > 1):
+                # If there are multiple options, choose one at random
+                return random.choice(optimalNextActions.tolist())
+            else:
+                # Only 1 optimal action so return it
+                return int(optimalNextActions[0])
+        else:
+            # Problem not seen already so return a random action
+            return heuristics.RandomHeuristic().getNextAction(problem, order)
+
+    # endregion
+
+    # region Batched Learning
+
+    # Learns from a batch of problems at once, where every problem does its next action at the same time
+    # The actions of all the problems are chosen together and the Q-Table is then updated for all of them together,
+    # so each step holds the lock twice for the whole batch rather than twice for every problem
+    # The rewards and successes are stored from index onwards
+    def __learnBatch(self, learnProblems, index):
+        # Gets the permuted problems and the keys they are stored under
+        permutedArrays, _, problemKeys = self.__permuteProblems(learnProblems)
+
+        # Gets the ID of each problem and the state of its empty ordering
+        with self.lock:
+            problemIds = numpy.array([self.stateIndex.internProblem(problemKey) for problemKey in problemKeys], dtype=numpy.int64)
+            states = numpy.array([self.stateIndex.findState(problemId, []) for problemId in problemIds.tolist()], dtype=numpy.int64)
+
+        # Opens a session for each problem so each action only needs the new connection routing
+        sessions = [evaluator.openSession(utilities.getProblemList(permutedArray)) for permutedArray in permutedArrays]
+
+        # The random generator used to choose between actions is seeded from random so seeding random still repeats the learning
+        randomGenerator = numpy.random.default_rng(random.getrandbits(64))
+
+        # Stores the orderings, successes and rewards, and the problems that are still being ordered
+        orders = numpy.full((len(learnProblems), self.points), -1, dtype=numpy.int64)
+        successes = numpy.zeros(len(learnProblems), dtype=numpy.int64)
+        rewards = numpy.zeros(len(learnProblems))
+        active = numpy.arange(0, len(learnProblems))
+
+        for point in range(0, self.points):
+            # Gets the next action of every problem still being ordered
+            with self.lock:
+                nextActions = self.__getNextLearnActions(states[active], orders[active, :point], randomGenerator)
+            orders[active, point] = nextActions
+
+            # Routes the new connection of each problem
+            for problemIndex, nextAction in zip(active.tolist(), nextActions.tolist()):
+                result = sessions[problemIndex].extend(nextAction)
+                successes[problemIndex] = result['success']
+                rewards[problemIndex] = ((utilities.MaxRewardPerPoint * (point + 1)) - result['measure']) if (result['success'] == 1) else 0
+
+            # Updates the arrays and moves to the next states
+            with self.lock:
+                updatedStates = self.__updateArraysBatch(problemIds[active], states[active], orders[active, :point],
+                                                         nextActions, successes[active], rewards[active])
+                if (self.planningSteps > 0):
+                    self.__planSteps(updatedStates, nextActions, rewards[active], successes[active], (point + 1) == self.points)
+                states[active] = self.stateIndex.getChildren(updatedStates, nextActions)
+
+            # Stops ordering the problems whose last connection failed
+            active = active[successes[active] == 1]
+            if (len(active) == 0):
+                break
+
+        # Stores the rewards and successes, which are 0 for the problems that failed
+        self.learnRewards[index:index + len(learnProblems)] = rewards.tolist()
+        self.learnSuccesses[index:index + len(learnProblems)] = successes.tolist()
+
+    # Gets the next action of each of the states when the agent is learning, in the same way as __getNextLearnAction
+    # The actions already done in each state are the rows of doneActions
+    def __getNextLearnActions(self, states, doneActions, randomGenerator):
+        # Gets the actions that haven't been done yet
+        remainingActions = numpy.ones((len(states), self.points), dtype=bool)
+        numpy.put_along_axis(remainingActions, doneActions, False, axis=1)
+
+        # Gets the actions to explore in the states that have been seen
+        candidateActions = numpy.zeros((len(states), self.points), dtype=bool)
+        seen = states != -1
+        if (seen.any()):
+            candidateActions[seen] = self.qTable.getExplorationMasks(states[seen], utilities.MaxRewardPerPoint * (doneActions.shape[1]+2))
+
+        # Where there aren't any actions to explore any remaining action can be chosen
+        candidateActions = numpy.where(candidateActions.any(axis=1, keepdims=True), candidateActions, remainingActions)
+
+        # Chooses one of the candidate actions of each state at random
+        return numpy.where(candidateActions, randomGenerator.random(candidateActions.shape), -1).argmax(axis=1)
+
+    # endregion
+
+    # region Parallel Learning
+
+    # Learns from the problems in rounds, where in each round every worker process learns from mergeInterval problems
+    # Each worker starts the round with a copy of the agent and afterwards the changes they made are merged into the agent
+    # The workers keep their copies for the whole call, starting from the agent as it is when they are started, and
+    # after each round they are only sent the states added and the rows changed by the merge to bring them up to date
+    # The problems and the random seed of each worker come from the seed, and the changes are merged in worker order,
+    # so learning with the same seed and number of workers always gives the same agent
+    def __learnParallel(self, numberOfProblems, squareSize, numberOfWorkers, mergeInterval, seed):
+        # Gets the sequence that the worker seeds are taken from and the source of the problems
+        seedSequence = numpy.random.SeedSequence(seed)
+        problemSource = evaluator.iterateProblems(self.points, squareSize, numberOfProblems)
+
+        # Each worker has its own connection, so the shards of each round go to the same workers every round
+        context = utilities.getForkContext()
+        connections = []
+        workers = []
+
         try:
-            # Gets the index of the problem
-            # This will be the index in all the other lists
-            problemIndex = self.problems[problemData]
+            for _ in range(0, numberOfWorkers):
+                connection, workerConnection = context.Pipe()
+                worker = context.Process(target=_runLearningWorker, args=(self, workerConnection), daemon=True)
+                worker.start()
+                workerConnection.close()
+
+                connections.append(connection)
+                workers.append(worker)
+
+            roundChanges = None
+            problemNumber = 0
+            while (problemNumber < numberOfProblems):
+                # Gets the problems for this round and splits them between the workers
+                # Every round but the last has a shard for every worker, so no worker misses the changes of a round
+                roundProblems = [next(problemSource) for _ in range(0, min(numberOfWorkers * mergeInterval, numberOfProblems - problemNumber))]
+                shards = [roundProblems[start:start + mergeInterval] for start in range(0, len(roundProblems), mergeInterval)]
+                workerSeeds = [int(workerSequence.generate_state(1)[0]) for workerSequence in seedSequence.spawn(len(shards))]
+
+                firstState = self.stateIndex.getNumberOfStates()
+                for connection, shard, workerSeed in zip(connections, shards, workerSeeds):
+                    connection.send((roundChanges, shard, workerSeed))
+
+                shardChanges = [_receiveWorkerResult(connection) for connection in connections[:len(shards)]]
+                changedRows = self.__mergeShards(shardChanges)
+
+                # The states the merge added and the rows it changed, which the workers need for the next round
+                rows = numpy.union1d(changedRows, numpy.arange(firstState, self.stateIndex.getNumberOfStates()))
+                roundChanges = {'firstState': firstState, 'newStates': self.stateIndex.getNewStates(firstState),
+                                'rows': rows, 'rowValues': self.qTable.getRows(rows)}
+
+                problemNumber += len(roundProblems)
+                utilities.outputPercentageComplete(problemNumber, numberOfProblems, self.reseenProblems)
+        finally:
+            # Tells the workers to stop, and stops any that don't
+            for connection in connections:
+                try:
+                    connection.send(None)
+                except OSError:
+                    pass
+                connection.close()
+
+            for worker in workers:
+                worker.join(WorkerStopTimeout)
+                if (worker.is_alive()):
+                    worker.terminate()
+
+    # Replaces the states and rows the worker added or changed in the last round with the ones the merge gave,
+    # so the worker's copy of the agent is the same as the agent again
+    def applyRoundChanges(self, changes):
+        firstState = changes['firstState']
+
+        self.stateIndex.removeStatesFrom(firstState)
+        self.stateIndex.addNewStates(changes['newStates'])
+        self.qTable.removeStatesFrom(firstState)
+        self.qTable.setRows(changes['rows'], changes['rowValues'])
+
+        # The worker's own transitions are kept, apart from the ones of the states that were replaced
+        self.transitionStore.discardStates(firstState)
+
+    # Learns from the problems in a worker process and returns the changes made to the agent
+    # The changes are the new states, the Q-Table rows that were changed and the learning rewards and successes
+    def learnShard(self, problems, seed):
+        random.seed(seed)
+
+        firstState = self.stateIndex.getNumberOfStates()
+        firstIndex = len(self.learnRewards)
+        firstReseenProblems = self.reseenProblems
+
+        # Records the states whose rows are changed
+        self.changedStates = set()
+
+        for problem in problems:
+            self.learnRewards.append(0)
+            self.learnSuccesses.append(0)
+            self.__learnProblem(problem, len(self.learnRewards) - 1)
 
-            # Sets up the arrays to store the optimal next action and optimal reward
-            optimalNextAction = [-1]
-            optimalReward = -10000
+        changedRows = numpy.array(sorted(self.changedStates), dtype=numpy.int64)
 
-            # Iterates through all the tried actions
-            for i in range(0, len(self.actions[problemIndex])):
-                # Want to find the action that is a combination of the one that gives the best reward
-                # and the one that will allow the agent to learn a lot
-                # Once the agent has learnt for a while, expectedInformation ~= 0
-                # So the best action is always chosen
-                expectedReward = (self.rewards1[problemIndex][i] + self.rewards2[problemIndex][i]) / 2
+        return {'newStates': self.stateIndex.getNewStates(firstState), 'firstState': firstState,
+                'rows': changedRows, 'rowValues': self.qTable.getRows(changedRows),
+                'learnRewards': self.learnRewards[firstIndex:], 'learnSuccesses': self.learnSuccesses[firstIndex:],
+                'reseenProblems': self.reseenProblems - firstReseenProblems}
 
-                # Adds a ratio of the max possible reward depending on how uncertain the action is
-                expectedInformation = (utilities.MaxRewardPerPoint * (len(order)+2)) * ((self.actionUncertainty1[problemIndex][i] + self.actionUncertainty2[problemIndex][i]) / 2)
+    # Learns from the problems with actor processes that all update the same Q-Table in shared memory
+    # Each actor sees the other actors' updates as soon as they are made, but the order they are made in depends on
+    # how the processes are scheduled, so unlike __learnParallel the result isn't the same every time
+    # The problems are handed out mergeInterval at a time
+    def __learnShared(self, numberOfProblems, squareSize, numberOfWorkers, mergeInterval, seed):
+        # Gets the sequence that the actor seeds are taken from
+        seedSequence = numpy.random.SeedSequence(seed)
 
-                expectedReward = expectedReward + expectedInformation
+        problems = list(evaluator.iterateProblems(self.points, squareSize, numberOfProblems))
+        shards = [problems[start:start + mergeInterval] for start in range(0, numberOfProblems, mergeInterval)]
+        actorSeeds = [int(actorSequence.generate_state(1)[0]) for actorSequence in seedSequence.spawn(len(shards))]
 
-                # Checks to see if the action was successful and checks that a higher reward was returned
-                if ((self.success[problemIndex][i] == 1) and (expectedReward > optimalReward)):
-                    optimalNextAction = [self.actions[problemIndex][i]]
-                    optimalReward = expectedReward
-                elif ((self.success[problemIndex][i] == 1) and (expectedReward == optimalReward)):
-                    optimalNextAction.append(self.actions[problemIndex][i])
+        # Copies the tables into shared memory, with space for every state the problems could add
+        keyLength = len(self.__permuteProblem(problems[0])[2])
+        localIndex, localTable = self.stateIndex, self.qTable
+        self.stateIndex, self.qTable = sharedQTable.createSharedTables(localIndex, localTable, keyLength,
+                                                                      numberOfProblems, numberOfProblems * self.points)
 
-            # Checks if a valid ordering was found
-            if (optimalNextAction == [-1]):
-                # No optimal action found so just return a random one
-                return heuristics.RandomHeuristic().getNextAction(problem, order)
-            else:
-                # Valid action found
-                if (len(optimalNextAction) > 1):
-                    # If there are multiple options, choose one at random
-                    return random.choice(optimalNextAction)
+        try:
+            with utilities.getForkContext().Pool(numberOfWorkers, initializer=_initialiseLearningWorker, initargs=(self,)) as pool:
+                problemNumber = 0
+                for learnRewards, learnSuccesses, reseenProblems in pool.imap(_learnActorShard, list(zip(shards, actorSeeds))):
+                    self.learnRewards.extend(learnRewards)
+                    self.learnSuccesses.extend(learnSuccesses)
+                    self.reseenProblems += reseenProblems
+
+                    problemNumber += len(learnRewards)
+                    utilities.outputPercentageComplete(problemNumber, numberOfProblems, self.reseenProblems)
+
+            # Copies the tables back out of shared memory
+            localIndex.setArrays(self.stateIndex.getArrays())
+            localTable.setArrays(self.qTable.getArrays())
+        finally:
+            self.stateIndex.close(unlink=True)
+            self.qTable.close(unlink=True)
+            self.stateIndex, self.qTable = localIndex, localTable
+
+    # Learns from the problems in an actor process that shares the Q-Table
+    # Returns the learning rewards, successes and number of reseen problems
+    def learnActorShard(self, problems, seed):
+        random.seed(seed)
+
+        firstIndex = len(self.learnRewards)
+        firstReseenProblems = self.reseenProblems
+
+        for problem in problems:
+            self.learnRewards.append(0)
+            self.learnSuccesses.append(0)
+            self.__learnProblem(problem, len(self.learnRewards) - 1)
+
+        return self.learnRewards[firstIndex:], self.learnSuccesses[firstIndex:], self.reseenProblems - firstReseenProblems
+
+    # Merges the changes the workers made into the agent, in worker order
+    def __mergeShards(self, shardChanges):
+        rowsList = []
+        deltasList = []
+
+        for changes in shardChanges:
+            # Maps the worker's states to the agent's states, where the states from before the round are the same
+            firstState = changes['firstState']
+            newStates = changes['newStates']
+            stateMap = {}
+
+            # Adds the new states in the order the worker added them, so a state's parent is always added first
+            newRoots = [(state, key, -1, -1) for key, state in zip(newStates['rootKeys'], newStates['rootStates'].tolist())]
+            newChildren = list(zip(newStates['childStates'].tolist(), [None] * len(newStates['childStates']),
+                                   newStates['childParents'].tolist(), newStates['childActions'].tolist()))
+            rowPositions = {row: position for position, row in enumerate(changes['rows'].tolist())}
+
+            for state, key, parent, action in sorted(newRoots + newChildren):
+                if (key is not None):
+                    problemId = self.stateIndex.internProblem(key)
+                    existingState = self.stateIndex.findState(problemId, [])
                 else:
-                    # Only 1 optimal action so return it
-                    return optimalNextAction[0]
-        except KeyError:
-            # Problem not seen already so return a random action
-            return heuristics.RandomHeuristic().getNextAction(problem, order)
+                    parent = stateMap.get(parent, parent)
+                    existingState = self.stateIndex.getChild(parent, action)
+
+                if (existingState == -1):
+                    # The actions that can't be done in the state are the ones already in its ordering
+                    doneActions = numpy.flatnonzero(~changes['rowValues']['valid'][rowPositions[state]])
+                    existingState = self.stateIndex.addRoot(problemId) if (key is not None) else self.stateIndex.addChild(parent, action)
+                    self.qTable.addState(doneActions)
+
+                stateMap[state] = existingState
+
+            # Gets how much the worker changed each row from the agent's values at the start of the round
+            # The rows of new states start with the same values in the agent and the worker
+            rows = numpy.array([stateMap.get(row, row) if (row >= firstState) else row for row in changes['rows'].tolist()], dtype=numpy.int64)
+            rowsList.append(rows)
+            deltasList.append(self.qTable.getDeltas(rows, changes['rowValues']))
+
+            # Adds the learning rewards and successes
+            self.learnRewards.extend(changes['learnRewards'])
+            self.learnSuccesses.extend(changes['learnSuccesses'])
+            self.reseenProblems += changes['reseenProblems']
+
+        self.qTable.mergeDeltas(rowsList, deltasList, self.requiredTimesSeen)
+
+        return numpy.unique(numpy.concatenate(rowsList)) if (len(rowsList) > 0) else numpy.zeros(0, dtype=numpy.int64)
 
     # endregion
 
@@ -221,11 +558,19 @@ class QLearningAgent(BaseRLAgent):
     # Gets a solution to the problem
     def getSolution(self, problem):
         # Gets the permuted problem and the permutation
-        permutedProblem, permutation = self.__permuteProblem(problem)
+        permutedProblem, permutation, problemKey = self.__permuteProblem(problem)
+
+        # Gets the ID of the problem and the state of the empty ordering
+        with self.lock:
+            problemId = self.stateIndex.internProblem(problemKey)
+            state = self.stateIndex.findState(problemId, [])
 
         # Stores the current points ordering
         currentOrder = []
 
+        # Opens a session so each action only needs the new connection routing
+        session = evaluator.openSession(permutedProblem)
+
         # Default values for success and reward
         success = 0
         reward = 0
@@ -235,13 +580,14 @@ class QLearningAgent(BaseRLAgent):
             # If an action is unsuccessful then can break from this loop
 
             # Get the best next action
-            nextAction = self.__getBestNextAction(permutedProblem, currentOrder)
+            with self.lock:
+                nextAction = self.__getBestNextAction(state, permutedProblem, currentOrder)
 
             # Updates the ordering
             newOrder = currentOrder + [nextAction]
 
-            # Check to see how well the random action has done
-            result = copt.evaluate(permutedProblem, newOrder)
+            # Check to see how well the action has done
+            result = session.extend(nextAction)
 
             # Get the reward and success
             # Does 100000 - reward so that we can use the conventional Q-Learning algorithm
@@ -254,7 +600,9 @@ class QLearningAgent(BaseRLAgent):
                 reward = 0
 
             # Update the arrays
-            self.__updateArrays(permutedProblem, currentOrder, nextAction, success, reward)
+            with self.lock:
+                state = self.__updateArrays(problemId, state, currentOrder, nextAction, success, reward)
+                state = self.stateIndex.getChild(state, nextAction)
 
             # Update the current order
             currentOrder = newOrder
@@ -272,103 +620,213 @@ class QLearningAgent(BaseRLAgent):
         return returnOrder, success, reward
 
     # Gets the next action that the agent thinks is best
-    def __getBestNextAction(self, permutedProblem, permutedOrder):
-        # Sets up the problem data to be how all problem data is stored
-        problemData = str(permutedProblem + [permutedOrder])
-
+    def __getBestNextAction(self, state, permutedProblem, permutedOrder):
         # Checks to see if the problem has already been seen
-        try:
-            # Gets the index of the problem
-            # This will be the index in all the other lists
-            problemIndex = self.problems[problemData]
-
-            # Sets up the arrays to store the optimal next action and optimal reward
-            optimalNextAction = -1
-            optimalReward = -1
-
-            # Iterates through all the tried actions
-            for i in range(0, len(self.actions[problemIndex])):
-                # Checks to see if the action was successful
-                # Also checks that a higher reward was returned
-                expectedReward = (self.rewards1[problemIndex][i] + self.rewards2[problemIndex][i]) / 2
-                if ((self.success[problemIndex][i] == 1) and (expectedReward > optimalReward)):
-                    optimalNextAction = self.actions[problemIndex][i]
-                    optimalReward = expectedReward
+        if (state != -1):
+            # Gets the successful action with the highest expected reward
+            optimalNextAction = self.qTable.getGreedyAction(state)
 
             # Checks if a valid ordering was found
             if (optimalNextAction == -1):
+                # Every remaining action is in the table and all are unsuccessful so can return any
                 # Finds the action which will connect the closest two points not already connected
-                nextAction = heuristics.ManhattanHeuristic().getNextAction(permutedProblem, permutedOrder)
-
-                # Checks to see if all the actions have been seen
-                # If so, all are unsuccessful so can return any
-                if (self.points == (len(permutedOrder) + len(self.actions[problemIndex]))):
-                    return nextAction
-
-                while (nextAction in self.actions[problemIndex]):
-                    # Keep getting a new action until its not been seen before
-                    nextAction = heuristics.RandomHeuristic().getNextAction(permutedProblem, permutedOrder)
-
-                # Found a different action to use
-                return nextAction
+                return heuristics.ManhattanHeuristic().getNextAction(permutedProblem, permutedOrder)
             else:
                 # Valid action found so return it
                 return optimalNextAction
-        except KeyError:
+        else:
             # Problem not seen already so find the shortest distance between points
             return heuristics.ManhattanHeuristic().getNextAction(permutedProblem, permutedOrder)
 
     # endregion
 
+    # region Get Solutions
+
+    # Gets solutions to a batch of problems, returning a list with the ordering, success and reward of each problem
+    # Unlike getSolution this doesn't change what the agent has learnt, so all the problems can be solved together
+    # Every problem does its next action at the same time, with the greedy actions of all the problems looked up at once
+    # and the action which connects the closest two points used where there isn't one
+    def getSolutions(self, problems):
+        if (len(problems) == 0):
+            return []
+
+        # Gets the permuted problems and the keys they are stored under
+        permutedArrays, permutations, problemKeys = self.__permuteProblems(problems)
+
+        # Gets the length of each connection, which is what the Manhattan Heuristic orders by
+        distances = numpy.sqrt(((permutedArrays[..., 0] - permutedArrays[..., 2]) ** 2) +
+                               ((permutedArrays[..., 1] - permutedArrays[..., 3]) ** 2)).astype(float)
+
+        # Gets the state of the empty ordering of each problem
+        with self.lock:
+            problemIds = [self.stateIndex.findProblem(problemKey) for problemKey in problemKeys]
+            states = numpy.array([self.stateIndex.findState(problemId, []) if (problemId != -1) else -1 for problemId in problemIds], dtype=numpy.int64)
+
+        # Opens a session for each problem so each action only needs the new connection routing
+        sessions = [evaluator.openSession(utilities.getProblemList(permutedArray)) for permutedArray in permutedArrays]
+
+        # Stores the orderings, successes and rewards, and the problems that are still being ordered
+        orders = numpy.full((len(problems), self.points), -1, dtype=numpy.int64)
+        successes = numpy.zeros(len(problems), dtype=numpy.int64)
+        rewards = numpy.zeros(len(problems))
+        active = numpy.arange(0, len(problems))
+
+        for point in range(0, self.points):
+            # Gets the greedy action of each problem whose state has been seen
+            activeStates = states[active]
+            seen = activeStates != -1
+            nextActions = numpy.full(len(active), -1, dtype=numpy.int64)
+
+            if (seen.any()):
+                with self.lock:
+                    nextActions[seen] = self.qTable.getGreedyActions(activeStates[seen])
+
+            # Uses the shortest connection that hasn't been done where there isn't a successful greedy action
+            doneActions = orders[active, :point]
+            remainingDistances = distances[active].copy()
+            numpy.put_along_axis(remainingDistances, doneActions, numpy.inf, axis=1)
+            nextActions = numpy.where(nextActions == -1, remainingDistances.argmin(axis=1), nextActions)
+            orders[active, point] = nextActions
+
+            # Routes the new connection of each problem
+            for problemIndex, nextAction in zip(active.tolist(), nextActions.tolist()):
+                result = sessions[problemIndex].extend(nextAction)
+                successes[problemIndex] = result['success']
+                rewards[problemIndex] = ((utilities.MaxRewardPerPoint * (point + 1)) - result['measure']) if (result['success'] == 1) else 0
+
+            # Moves to the next states, and stops ordering the problems whose last connection failed
+            with self.lock:
+                states[active] = self.stateIndex.getChildren(activeStates, nextActions)
+
+            active = active[successes[active] == 1]
+            if (len(active) == 0):
+                break
+
+        # Unpermutes the orders, storing -1 where there is nothing
+        returnOrders = numpy.where(orders != -1, numpy.take_along_axis(permutations, numpy.maximum(orders, 0), axis=1), -1)
+
+        return [(returnOrders[index].tolist(), int(successes[index]), float(rewards[index])) for index in range(0, len(problems))]
+
+    # endregion
+
+    # region Planning
+
+    # Stores the transition of an action the agent has done and then replays planningSteps stored transitions
+    # Replaying a transition updates the Q-Table in the same way as doing the action, without routing the problem again
+    def __planStep(self, state, action, reward, success, lastAction):
+        self.__addTransition(state, action, reward, success, lastAction)
+        self.__replayTransitions(self.planningSteps)
+
+    # Stores the transitions of a batch of actions, which all have the same number of actions done before them,
+    # and then replays planningSteps stored transitions for each of them
+    def __planSteps(self, states, actions, rewards, successes, lastAction):
+        for state, action, reward, success in zip(states.tolist(), actions.tolist(), rewards.tolist(), successes.tolist()):
+            self.__addTransition(state, action, reward, success, lastAction)
+
+        self.__replayTransitions(self.planningSteps * len(states))
+
+    # Stores the transition and queues it by how much replaying it, with the average reward, would change the Q-Table
+    def __addTransition(self, state, action, reward, success, lastAction):
+        nextState = self.stateIndex.getChild(state, action)
+        position = self.transitionStore.add(state, action, reward, success, nextState, lastAction)
+
+        self.transitionStore.setPriority(position, self.__getPriority(*self.transitionStore.get(position)[:5]))
+
+    # Replays up to the number of transitions, taking the one that would change the Q-Table the most each time
+    # A transition is replayed at most once each time, so the replays go back through the states that lead to the change
+    def __replayTransitions(self, numberOfReplays):
+        store = self.transitionStore
+        replayed = set()
+
+        for _ in range(0, numberOfReplays):
+            position = store.popHighest()
+            if (position == -1):
+                # Nothing replaying would change so can stop planning
+                break
+
+            replayed.add(position)
+            state, action, reward, success, nextState, lastAction = store.get(position)
+
+            # The state the action leads to might have been added since the transition was stored
+            if (nextState == -1):
+                nextState = self.stateIndex.getChild(state, action)
+                store.setNextState(position, nextState)
+
+            # Records that the row of the state is changing
+            if (self.changedStates is not None):
+                self.changedStates.add(state)
+
+            self.__replayValues(state, action, nextState, success, reward, lastAction)
+
+            # Queues the transition that leads to the state, as the expected future reward it uses has changed
+            predecessor = store.getPredecessor(state)
+            if ((predecessor != -1) and (predecessor not in replayed)):
+                store.setPriority(predecessor, self.__getPriority(*store.get(predecessor)[:5]))
+
+    # Updates the values of the action in the state from a stored transition
+    # The transition's reward is already the average of the rewards seen, so rather than counting as another reward
+    # towards requiredTimesSeen both estimates are changed straight away, in the same way as when enough rewards are seen
+    def __replayValues(self, state, action, nextState, success, reward, lastAction):
+        table = self.qTable
+
+        # Holds the lock of the row while it is changed, which is only needed when actor processes share the table
+        with table.getLock(state):
+            if ((table.getNextSuccess(nextState) == 0) or (success == 0)):
+                # If all the next actions result in an unsuccessful ordering then the action is unsuccessful
+                for estimate in (1, 2):
+                    table.setReward(state, action, estimate, 0)
+                    table.setUncertainty(state, action, estimate, 0)
+                table.setSuccess(state, action, 0)
+                return
+
+            for estimate, rewards in ((1, table.rewards1), (2, table.rewards2)):
+                # Changes the reward if there is enough of a change
+                targetReward = reward + (self.gamma * table.getExpectedFutureReward(nextState, estimate))
+                if (abs(rewards[state, action] - targetReward) >= (2 * self.minChange)):
+                    table.setReward(state, action, estimate, targetReward + self.minChange)
+
+                # Update the uncertainty of the action
+                table.setUncertainty(state, action, estimate, 0 if (lastAction) else table.getUncertainty(nextState, estimate))
+
+    # Gets the priority of a transition, which is the largest change replaying it would make to either estimate
+    # Changes smaller than twice the minimum change don't change the rewards so have a priority of 0
+    def __getPriority(self, state, action, reward, success, nextState):
+        table = self.qTable
+
+        if ((table.getNextSuccess(nextState) == 0) or (success == 0)):
+            # Replaying would set the rewards to 0 and mark the action as unsuccessful, which matters most of all
+            if (table.success[state, action] == 1):
+                return utilities.MaxRewardPerPoint * self.points
+
+            change = max(abs(table.rewards1[state, action]), abs(table.rewards2[state, action]))
+        else:
+            change = max(abs(reward + (self.gamma * table.getExpectedFutureReward(nextState, 1)) - table.rewards1[state, action]),
+                         abs(reward + (self.gamma * table.getExpectedFutureReward(nextState, 2)) - table.rewards2[state, action]))
+
+        return float(change) if (change >= (2 * self.minChange)) else 0
+
+    # endregion
+
     # region Permute
 
     # Permutes the problem so that the point with the smallest x index will be first etc
-    # Returns the permuted problem as well as the permutation
+    # Returns the permuted problem, the permutation and the key the permuted problem is stored under
     def __permuteProblem(self, problem):
-        # Rounds all the points to the nearest roundNumber
-        roundedProblem = [(-1, -1, -1, -1)]*self.points
-        for j in range(0, self.points):
-            roundedProblem[j] = (self.roundNumber * round(problem[j][0] / float(self.roundNumber)),
-                                 self.roundNumber * round(problem[j][1] / float(self.roundNumber)),
-                                 self.roundNumber * round(problem[j][2] / float(self.roundNumber)),
-                                 self.roundNumber * round(problem[j][3] / float(self.roundNumber)))
-
-        # Initialises the two arrays that will be returned
-        permutedProblem = [(-1, -1, -1, -1)]*self.points
-        permutation = [-1]*self.points
-
-        # Iterates through the problem
-        for j in range(0, self.points):
-            lowestVal = (10000, 10000, 10000, 10000)
-            lowestIndex = -1
-            for k in range(0, self.points):
-                if (roundedProblem[k] in permutedProblem):
-                    # Point already in the permuted list so continue
-                    continue
-                else:
-                    # Checks to see if this point is lower than the current lowest
-                    if (roundedProblem[k][0] < lowestVal[0]):
-                        lowestVal = roundedProblem[k]
-                        lowestIndex = k
-                    elif (roundedProblem[k][0] == lowestVal[0]):
-                        if (roundedProblem[k][1] < lowestVal[1]):
-                            lowestVal = roundedProblem[k]
-                            lowestIndex = k
-                        elif (roundedProblem[k][1] == lowestVal[1]):
-                            if (roundedProblem[k][2] < lowestVal[2]):
-                                lowestVal = roundedProblem[k]
-                                lowestIndex = k
-                            elif (roundedProblem[k][2] == lowestVal[2]):
-                                if (roundedProblem[k][3] < lowestVal[3]):
-                                    lowestVal = roundedProblem[k]
-                                    lowestIndex = k
-
-            # Adds the lowest point to the permuted list
-            permutedProblem[j] = lowestVal
-            permutation[j] = lowestIndex
-
-        # Returns the new problem and index
-        return permutedProblem, permutation
+        return utilities.getPermutedProblem(problem, self.roundNumber, self.reduceSymmetry)
+
+    # Permutes a batch of problems at once in the same way as __permuteProblem
+    # Returns the permuted problems and permutations as arrays, and the list of keys the problems are stored under
+    def __permuteProblems(self, problems):
+        problemArrays = numpy.asarray(problems, dtype=numpy.int64)
+
+        if (self.reduceSymmetry):
+            canonicalArrays, permutations, _ = utilities.getSymmetricCanonicalProblems(problemArrays, self.roundNumber)
+            permutedArrays = numpy.take_along_axis(utilities.roundProblems(problemArrays, self.roundNumber), permutations[..., None], axis=1)
+        else:
+            permutedArrays, permutations, _ = utilities.getCanonicalProblems(problemArrays, self.roundNumber)
+            canonicalArrays = permutedArrays
+
+        return permutedArrays, permutations, [canonicalArray.tobytes() for canonicalArray in canonicalArrays]
 
     # endregion
 
@@ -376,196 +834,253 @@ class QLearningAgent(BaseRLAgent):
 
     # Updates all the arrays that are used in storing the action-space
     # Uses the Q-Learning algorithm to update them
-    def __updateArrays(self, problem, previousOrder, action, success, reward):
-        # Sets up the problem data
-        problemData = str(problem + [previousOrder])
-
-        try:
+    # Returns the index of the state, which is added if it hasn't been seen before
+    def __updateArrays(self, problemId, state, previousOrder, action, success, reward):
+        if (state != -1):
             # Gets the index of the problem
-            problemIndex = self.problems[problemData]
+            problemIndex = state
 
             # Increment a reseen problems counter by 1
             self.reseenProblems += 1
-        except KeyError:
+        else:
             # If it is a new problem then need to add 0 values to all the arrays
-            self.__addActions(problemData, previousOrder)
+            problemIndex = self.__addActions(problemId, previousOrder)
 
-            # Gets the index of the problem
-            problemIndex = self.problems[problemData]
+        # Records that the row of the state is changing
+        if (self.changedStates is not None):
+            self.changedStates.add(problemIndex)
 
-        # Gets the index of the action
-        actionIndex = self.actions[problemIndex].index(action)
+        # Gets the state the action leads to, the row of the Q-Table is the state and the column is the action
+        nextState = self.stateIndex.getChild(problemIndex, action)
+        self.__updateValues(problemIndex, action, nextState, success, reward, (len(previousOrder) + 1) == self.points)
 
-        if ((self.__getNextSuccess(str(problem + [previousOrder + [action]])) == 0) or (success == 0)):
-            # If all the next actions result in an unsuccessful ordering then set the reward to 0
-            self.rewards1[problemIndex][actionIndex] = 0
-            self.rewards2[problemIndex][actionIndex] = 0
+        return problemIndex
 
-            # Updates the success value to be 0
-            self.success[problemIndex][actionIndex] = 0
+    # Updates the values of the action in the state, using the state the action leads to
+    # Used both for the actions the agent does and for the transitions it replays when planning
+    def __updateValues(self, problemIndex, action, nextState, success, reward, lastAction):
+        table = self.qTable
 
-            # Updates the uncertainty to 0
-            self.actionUncertainty1[problemIndex][actionIndex] = 0
-            self.actionUncertainty2[problemIndex][actionIndex] = 0
-        else:
-            # Updates the success value
-            self.success[problemIndex][actionIndex] = success
+        # Holds the lock of the row while it is changed, which is only needed when actor processes share the table
+        with table.getLock(problemIndex):
+            if ((table.getNextSuccess(nextState) == 0) or (success == 0)):
+                # If all the next actions result in an unsuccessful ordering then set the reward to 0
+                table.setReward(problemIndex, action, 1, 0)
+                table.setReward(problemIndex, action, 2, 0)
 
-            randInt = random.random()
-            if (randInt < 0.5):
-                # Gets the expected future reward
-                expectedFutureReward = self.__getExpectedFutureReward(
-                    str(problem + [previousOrder + [action]]), 1)
+                # Updates the success value to be 0
+                table.setSuccess(problemIndex, action, 0)
 
-                # Update the temp reward and counter
-                self.tempReward1[problemIndex][actionIndex] = self.tempReward1[problemIndex][actionIndex] + reward + (self.gamma * expectedFutureReward)
-                self.timesSeen1[problemIndex][actionIndex] += 1
-
-                # Checks to see if the problem and action has been seen enough
-                if (self.timesSeen1[problemIndex][actionIndex] == self.requiredTimesSeen):
-                    # Check to see if there has been enough of a change
-                    if (abs(self.rewards1[problemIndex][actionIndex] - (self.tempReward1[problemIndex][actionIndex] / self.requiredTimesSeen)) >= (2 * self.minChange)):
-                        # Change the reward
-                        self.rewards1[problemIndex][actionIndex] = (self.tempReward1[problemIndex][actionIndex] / self.requiredTimesSeen) + self.minChange
-
-                    # Reset the variables to 0
-                    self.tempReward1[problemIndex][actionIndex] = 0
-                    self.timesSeen1[problemIndex][actionIndex] = 0
-
-                    # Update the uncertainty of the values
-                    if ((len(previousOrder) + 1) == self.points):
-                        # Update the uncertainty to 0
-                        self.actionUncertainty1[problemIndex][actionIndex] = 0
-                    else:
-                        # Update the uncertainty of the action
-                        self.actionUncertainty1[problemIndex][actionIndex] = self.__getUncertainty(problem, previousOrder, action, 1)
+                # Updates the uncertainty to 0
+                table.setUncertainty(problemIndex, action, 1, 0)
+                table.setUncertainty(problemIndex, action, 2, 0)
             else:
-                # Gets the expected future reward
-                expectedFutureReward = self.__getExpectedFutureReward(str(problem + [previousOrder + [action]]), 2)
+                # Updates the success value
+                table.setSuccess(problemIndex, action, success)
+
+                randInt = random.random()
+                if (randInt < 0.5):
+                    # Gets the expected future reward
+                    expectedFutureReward = table.getExpectedFutureReward(nextState, 1)
+
+                    # Update the temp reward and counter
+                    table.tempReward1[problemIndex, action] = table.tempReward1[problemIndex, action] + reward + (self.gamma * expectedFutureReward)
+                    table.timesSeen1[problemIndex, action] += 1
+
+                    # Checks to see if the problem and action has been seen enough
+                    if (table.timesSeen1[problemIndex, action] == self.requiredTimesSeen):
+                        # Check to see if there has been enough of a change
+                        if (abs(table.rewards1[problemIndex, action] - (table.tempReward1[problemIndex, action] / self.requiredTimesSeen)) >= (2 * self.minChange)):
+                            # Change the reward
+                            table.setReward(problemIndex, action, 1, (table.tempReward1[problemIndex, action] / self.requiredTimesSeen) + self.minChange)
+
+                        # Reset the variables to 0
+                        table.tempReward1[problemIndex, action] = 0
+                        table.timesSeen1[problemIndex, action] = 0
+
+                        # Update the uncertainty of the values
+                        if (lastAction):
+                            # Update the uncertainty to 0
+                            table.setUncertainty(problemIndex, action, 1, 0)
+                        else:
+                            # Update the uncertainty of the action
+                            table.setUncertainty(problemIndex, action, 1, table.getUncertainty(nextState, 1))
+                else:
+                    # Gets the expected future reward
+                    expectedFutureReward = table.getExpectedFutureReward(nextState, 2)
+
+                    # Update the temp reward and counter
+                    table.tempReward2[problemIndex, action] = table.tempReward2[problemIndex, action] + reward + (self.gamma * expectedFutureReward)
+                    table.timesSeen2[problemIndex, action] += 1
+
+                    # Checks to see if the problem and action has been seen enough
+                    if (table.timesSeen2[problemIndex, action] == self.requiredTimesSeen):
+                        # Check to see if there has been enough of a change
+                        if (abs(table.rewards2[problemIndex, action] - (table.tempReward2[problemIndex, action] / self.requiredTimesSeen)) >= (2 * self.minChange)):
+                            # Change the reward
+                            table.setReward(problemIndex, action, 2, (table.tempReward2[problemIndex, action] / self.requiredTimesSeen) + self.minChange)
+
+                        # Reset the variables to 0
+                        table.tempReward2[problemIndex, action] = 0
+                        table.timesSeen2[problemIndex, action] = 0
+
+                        # Update the uncertainty of the values
+                        if (lastAction):
+                            # Update the uncertainty to 0
+                            table.setUncertainty(problemIndex, action, 2, 0)
+                        else:
+                            # Update the uncertainty of the action
+                            table.setUncertainty(problemIndex, action, 2, table.getUncertainty(nextState, 2))
+
+    # Updates the arrays for a batch of actions at once, in the same way as calling __updateArrays for each action in turn
+    # Every state has to have the same number of actions done, so that no state the updates read from
+    # (the states after the actions) is a state that is updated
+    # Actions done more than once in the same state are updated in turn, in the order they are given
+    # Returns the indexes of the states, which are added if they haven't been seen before
+    def __updateArraysBatch(self, problemIds, states, previousOrders, actions, successes, rewards):
+        # Adds the states that haven't been seen, unless an earlier problem in the batch has already added them
+        problemIndexes = states.copy()
+        seen = states != -1
+        for position in numpy.flatnonzero(~seen).tolist():
+            previousOrder = previousOrders[position].tolist()
+            problemIndexes[position] = self.stateIndex.findState(int(problemIds[position]), previousOrder)
+            seen[position] = problemIndexes[position] != -1
+
+            if (not seen[position]):
+                problemIndexes[position] = self.__addActions(int(problemIds[position]), previousOrder)
+
+        # Increment the reseen problems counter by the number of states already seen
+        self.reseenProblems += int(seen.sum())
+
+        # Records that the rows of the states are changing
+        if (self.changedStates is not None):
+            self.changedStates.update(problemIndexes.tolist())
+
+        table = self.qTable
+        nextStates = self.stateIndex.getChildren(problemIndexes, actions).astype(numpy.int64)
+
+        # Gets which actions failed, and for the others which estimate is updated
+        # The random numbers are only taken for the actions that didn't fail, in order, as __updateArrays does
+        failed = (table.getNextSuccesses(nextStates) == 0) | (successes == 0)
+        useFirstEstimate = numpy.zeros(len(actions), dtype=bool)
+        useFirstEstimate[~failed] = [random.random() < 0.5 for _ in range(0, int((~failed).sum()))]
+
+        # Gets how many times each state and action has already come up in the batch, so repeats are updated in turn
+        pairs = (problemIndexes * self.points) + actions
+        pairOrder = numpy.argsort(pairs, kind='stable')
+        sortedPairs = pairs[pairOrder]
+        firstPositions = numpy.flatnonzero(numpy.r_[True, sortedPairs[1:] != sortedPairs[:-1]])
+        repeats = numpy.empty(len(pairs), dtype=numpy.int64)
+        repeats[pairOrder] = numpy.arange(0, len(pairs)) - numpy.repeat(firstPositions, numpy.diff(numpy.r_[firstPositions, len(pairs)]))
+
+        lastAction = (previousOrders.shape[1] + 1) == self.points
+
+        for repeat in range(0, int(repeats.max()) + 1):
+            update = repeats == repeat
+
+            # If all the next actions result in an unsuccessful ordering then set the rewards, success and uncertainty to 0
+            rows, columns = problemIndexes[update & failed], actions[update & failed]
+            for estimate in (1, 2):
+                table.setRewards(rows, columns, estimate, 0)
+                table.setUncertainties(rows, columns, estimate, 0)
+            table.setSuccesses(rows, columns, 0)
+
+            # Updates the success value
+            rows, columns = problemIndexes[update & ~failed], actions[update & ~failed]
+            table.setSuccesses(rows, columns, successes[update & ~failed])
+
+            for estimate, useEstimate in ((1, useFirstEstimate), (2, ~useFirstEstimate)):
+                rewardArray = table.rewards1 if (estimate == 1) else table.rewards2
+                tempRewardArray, timesSeenArray = (table.tempReward1, table.timesSeen1) if (estimate == 1) else (table.tempReward2, table.timesSeen2)
+
+                positions = update & ~failed & useEstimate
+                rows, columns, positionNextStates = problemIndexes[positions], actions[positions], nextStates[positions]
 
                 # Update the temp reward and counter
-                self.tempReward2[problemIndex][actionIndex] = self.tempReward2[problemIndex][actionIndex] + reward + (self.gamma * expectedFutureReward)
-                self.timesSeen2[problemIndex][actionIndex] += 1
-
-                # Checks to see if the problem and action has been seen enough
-                if (self.timesSeen2[problemIndex][actionIndex] == self.requiredTimesSeen):
-                    # Check to see if there has been enough of a change
-                    if (abs(self.rewards2[problemIndex][actionIndex] - (self.tempReward2[problemIndex][actionIndex] / self.requiredTimesSeen)) >= (2 * self.minChange)):
-                        # Change the reward
-                        self.rewards2[problemIndex][actionIndex] = (self.tempReward2[problemIndex][actionIndex] / self.requiredTimesSeen) + self.minChange
-
-                    # Reset the variables to 0
-                    self.tempReward2[problemIndex][actionIndex] = 0
-                    self.timesSeen2[problemIndex][actionIndex] = 0
-
-                    # Update the uncertainty of the values
-                    if ((len(previousOrder) + 1) == self.points):
-                        # Update the uncertainty to 0
-                        self.actionUncertainty2[problemIndex][actionIndex] = 0
-                    else:
-                        # Update the uncertainty of the action
-                        self.actionUncertainty2[problemIndex][actionIndex] = self.__getUncertainty(problem, previousOrder, action, 2)
-
-    # Adds all possible actions to the arrays
-    def __addActions(self, problemData, previousOrder):
-        # If it is a new problem then need to add 0 values to all the arrays
-
-        # Adds the problem to the array and gets the index
-        self.problems[problemData] = len(self.problems)
-        problemIndex = self.problems[problemData]
-
-        # Adds the arrays for the action, success, rewards, uncertainty, temporary rewards and counters
-        self.actions.append([])
-        self.success.append([])
-        self.rewards1.append([])
-        self.rewards2.append([])
-        self.actionUncertainty1.append([])
-        self.actionUncertainty2.append([])
-        self.tempReward1.append([])
-        self.tempReward2.append([])
-        self.timesSeen1.append([])
-        self.timesSeen2.append([])
-
-        # Adds all the possible actions for this problem
-        # Initialises the success as 1 and the reward as 0 if it hasn't been seen yet
-        for nextAction in range(0, self.points):
-            if (nextAction in previousOrder):
-                # Action already done so can't do it again and doesn't need to be added to the arrays
-                pass
-            else:
-                # Adds the actions not seen with success 1
-                self.actions[problemIndex].append(nextAction)
-                self.success[problemIndex].append(1)
+                tempRewardArray[rows, columns] += rewards[positions] + (self.gamma * table.getExpectedFutureRewards(positionNextStates, estimate))
+                timesSeenArray[rows, columns] += 1
 
-                # Adds a reward of 0
-                self.rewards1[problemIndex].append(0)
-                self.rewards2[problemIndex].append(0)
+                # Checks to see which states and actions have been seen enough
+                seenEnough = timesSeenArray[rows, columns] == self.requiredTimesSeen
+                rows, columns, positionNextStates = rows[seenEnough], columns[seenEnough], positionNextStates[seenEnough]
 
-                # Adds an uncertainty of 1
-                self.actionUncertainty1[problemIndex].append(1)
-                self.actionUncertainty2[problemIndex].append(1)
+                # Changes the rewards where there has been enough of a change
+                averageRewards = tempRewardArray[rows, columns] / self.requiredTimesSeen
+                changed = numpy.abs(rewardArray[rows, columns] - averageRewards) >= (2 * self.minChange)
+                table.setRewards(rows[changed], columns[changed], estimate, averageRewards[changed] + self.minChange)
 
-                # Adds 0 to the temp rewards and counters
-                self.tempReward1[problemIndex].append(0)
-                self.tempReward2[problemIndex].append(0)
-                self.timesSeen1[problemIndex].append(0)
-                self.timesSeen2[problemIndex].append(0)
+                # Reset the variables to 0
+                tempRewardArray[rows, columns] = 0
+                timesSeenArray[rows, columns] = 0
 
-    # endregion
+                # Update the uncertainty of the values, which is 0 after the last action
+                table.setUncertainties(rows, columns, estimate, 0 if (lastAction) else table.getUncertainties(positionNextStates, estimate))
 
-    # region Private Getters
+        return problemIndexes
 
-    # Gets the expected future reward of the next actions
-    def __getExpectedFutureReward(self, newProblemState, dictToUse):
-        try:
-            # Gets the index of the new problem
-            newProblemIndex = self.problems[newProblemState]
+    # Adds all possible actions to the Q-Table
+    # Returns the index of the new state
+    def __addActions(self, problemId, previousOrder):
+        # If it is a new problem then need to add a row to the Q-Table
 
-            if (dictToUse == 1):
-                # Gets the action which returns the highest reward in the first array
-                actionIndex = self.rewards2[newProblemIndex].index(max(self.rewards2[newProblemIndex]))
+        # Adds the state to the index, below the state of the ordering without the last action
+        if (len(previousOrder) == 0):
+            problemIndex = self.stateIndex.addRoot(problemId)
+        else:
+            previousState = self.stateIndex.findState(problemId, previousOrder[:-1])
+            problemIndex = self.stateIndex.addChild(previousState, previousOrder[-1])
 
-                # Return the predicted reward of the action in the second array
-                return self.rewards1[newProblemIndex][actionIndex]
-            else:
-                # Gets the action which returns the highest reward in the second array
-                actionIndex = self.rewards1[newProblemIndex].index(max(self.rewards1[newProblemIndex]))
+        # Adds the row, where the actions already done can't be done again
+        # The actions not seen start with success 1, reward 0 and uncertainty 1
+        # Another thread learning the same problem can add the state between this thread reading it and taking the lock,
+        # in which case the index returns the existing state and the row has already been added
+        if (problemIndex == self.qTable.getNumberOfStates()):
+            self.qTable.addState(previousOrder)
 
-                # Return the predicted reward of the action in the first array
-                return self.rewards2[newProblemIndex][actionIndex]
-        except KeyError:
-            # Problem not seen before so return 0
-            return 0
+        return problemIndex
 
-    # Gets whether the next state returns at least 1 successful ordering
-    def __getNextSuccess(self, newProblemState):
-        try:
-            # Gets the index of the new problem
-            newProblemIndex = self.problems[newProblemState]
+    # endregion
 
-            # Returns 1 if there is a successful ordering and 0 if all orderings are unsuccessful
-            return max(self.success[newProblemIndex])
-        except KeyError:
-            # Problem not seen so presume success
-            return 1
+    # region Save and Load
 
-    # Returns the uncertainty of doing the action in the current problem
-    def __getUncertainty(self, problem, order, action, arrayToUse):
-        # Get the problem
-        problemData = str(problem + [order + [action]])
+    # Saves everything the agent has learnt, and the constants it learnt with, to a NumPy .npz file
+    # The file is written to a temporary file and then renamed so a saved agent is never left half written
+    def save(self, path):
+        arrays = {'version': numpy.array(AgentFormatVersion)}
+        arrays.update({'constant.' + name: numpy.array(getattr(self, name)) for name in SavedConstantNames})
+        arrays.update({'index.' + name: array for name, array in self.stateIndex.getArrays().items()})
+        arrays.update({'table.' + name: array for name, array in self.qTable.getArrays().items()})
+        arrays['learnRewards'] = numpy.array(self.learnRewards, dtype=float)
+        arrays['learnSuccesses'] = numpy.array(self.learnSuccesses, dtype=numpy.int8)
 
+        fileDescriptor, temporaryFile = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
         try:
-            # Gets the index of the problem
-            problemIndex = self.problems[problemData]
+            with os.fdopen(fileDescriptor, "wb") as openFile:
+                numpy.savez(openFile, **arrays)
+
+            os.replace(temporaryFile, path)
+        except BaseException:
+            os.remove(temporaryFile)
+            raise
+
+    # Loads an agent that was saved with save
+    @staticmethod
+    def load(path):
+        with numpy.load(path) as arrays:
+            if (int(arrays['version']) != AgentFormatVersion):
+                raise ValueError("Unsupported agent version: " + str(int(arrays['version'])))
 
-            # Gets the array to use
-            uncertaintyArray = self.actionUncertainty1[problemIndex] if (arrayToUse == 1) else self.actionUncertainty2[problemIndex]
+            constants = {name: arrays['constant.' + name].item() for name in SavedConstantNames}
+            agent = QLearningAgent(constants['points'], constants['roundNumber'], constants['reduceSymmetry'])
+            for name in SavedConstantNames:
+                setattr(agent, name, constants[name])
 
-            # Returns the average of the future uncertainties
-            return (sum(uncertaintyArray) / float(len(uncertaintyArray)))
-        except KeyError:
-            # Problem not seen so uncertainty is 1
-            return 1
+            agent.stateIndex.setArrays({name: arrays['index.' + name] for name in ('problemKeys', 'roots', 'children')})
+            agent.qTable.setArrays({name: arrays['table.' + name] for name in qTable.QTable.ArrayNames})
+            agent.learnRewards = arrays['learnRewards'].tolist()
+            agent.learnSuccesses = arrays['learnSuccesses'].tolist()
+
+        return agent
 
     # endregion
 
@@ -582,3 +1097,48 @@ class QLearningAgent(BaseRLAgent):
     # endregion
 
 # endregion
+
+# region Parallel Learning Workers
+
+# The agent being learnt in the actor process
+_learningAgent = None
+
+# Stores the copy of the agent in the actor process
+def _initialiseLearningWorker(agent):
+    global _learningAgent
+    _learningAgent = agent
+
+# Runs a worker process of __learnParallel, which learns from the shard it's sent each round with its own copy of the
+# agent, after bringing the copy up to date with the changes of the last round
+# Sends back the changes it made, or the error if learning failed, and stops when it's sent None
+def _runLearningWorker(agent, connection):
+    while True:
+        task = connection.recv()
+        if (task is None):
+            return
+
+        roundChanges, problems, seed = task
+        try:
+            if (roundChanges is not None):
+                agent.applyRoundChanges(roundChanges)
+
+            result = agent.learnShard(problems, seed)
+        except BaseException as error:
+            result = error
+
+        connection.send(result)
+
+# Gets the result a worker process sent back, raising the error if it failed
+def _receiveWorkerResult(connection):
+    result = connection.recv()
+    if (isinstance(result, BaseException)):
+        raise result
+
+    return result
+
+# Learns from the problems of one actor, which shares the Q-Table with the other actors
+def _learnActorShard(arguments):
+    problems, seed = arguments
+    return _learningAgent.learnActorShard(problems, seed)
+
+# endregion
@@ -0,0 +1,115 @@
+import os
+import queue
+import threading
+
+# region Constants
+
+# Number of worker threads used when one isn't given
+DefaultNumberOfWorkers = min(8, os.cpu_count() or 1)
+
+# Number of tasks that can be waiting for each worker before submit blocks
+QueuedTasksPerWorker = 2
+
+# endregion
+
+# region Scheduler
+
+# Runs tasks on a fixed number of worker threads, keeping their results in the order they were submitted
+# The queue of waiting tasks is bounded, so submit blocks while the workers are busy rather than piling up tasks
+# Each result is passed to the callback as soon as the task finishes, with the scheduler's lock held so the callback
+# can add the results up without a lock of its own
+# With 0 workers each task is run by submit on the calling thread, so the tasks run one after another in a fixed order
+class Scheduler():
+
+    # Constructor that starts the worker threads
+    def __init__(self, numberOfWorkers=DefaultNumberOfWorkers, callback=None, maxQueuedTasks=None):
+        if (maxQueuedTasks is None):
+            maxQueuedTasks = QueuedTasksPerWorker * numberOfWorkers
+
+        self.tasks = queue.Queue(maxQueuedTasks)
+        self.callback = callback
+        self.lock = threading.Lock()
+
+        # Results of the tasks in the order they were submitted, the number that have finished and the first error raised
+        self.results = []
+        self.completedTasks = 0
+        self.error = None
+
+        self.workers = [threading.Thread(target=self.__runTasks, daemon=True) for _ in range(0, numberOfWorkers)]
+        for worker in self.workers:
+            worker.start()
+
+    # Runs tasks until the scheduler is closed
+    def __runTasks(self):
+        while True:
+            task = self.tasks.get()
+
+            # None tells the worker to stop
+            if (task is None):
+                self.tasks.task_done()
+                return
+
+            self.__runTask(*task)
+            self.tasks.task_done()
+
+    # Runs the task and stores its result, passing it to the callback
+    def __runTask(self, taskNumber, function, arguments):
+        try:
+            result, error = function(*arguments), None
+        except BaseException as taskError:
+            result, error = None, taskError
+
+        with self.lock:
+            self.results[taskNumber] = result
+            self.completedTasks += 1
+
+            # Passes the result to the callback, keeping the error if either the task or the callback failed
+            if ((error is None) and (self.callback is not None)):
+                try:
+                    self.callback(taskNumber, result)
+                except BaseException as callbackError:
+                    error = callbackError
+
+            if ((error is not None) and (self.error is None)):
+                self.error = error
+
+    # Adds a task that calls the function with the arguments and returns the task's number
+    # Blocks while the queue of waiting tasks is full, or until the task has run if there are no workers
+    def submit(self, function, *arguments):
+        with self.lock:
+            taskNumber = len(self.results)
+            self.results.append(None)
+
+        if (len(self.workers) == 0):
+            self.__runTask(taskNumber, function, arguments)
+        else:
+            self.tasks.put((taskNumber, function, arguments))
+        return taskNumber
+
+    # Blocks until every submitted task has finished and returns their results in the order they were submitted
+    # If a task raised an error then it is raised here
+    def join(self):
+        self.tasks.join()
+
+        with self.lock:
+            if (self.error is not None):
+                error, self.error = self.error, None
+                raise error
+
+            return list(self.results)
+
+    # Stops the worker threads once the tasks already submitted have finished
+    def close(self):
+        for _ in self.workers:
+            self.tasks.put(None)
+
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+# endregion
@@ -0,0 +1,310 @@
+import zlib
+from multiprocessing import shared_memory
+import numpy
+import qTable
+import utilities
+
+# region Constants
+
+# Number of locks the rows of a shared Q-Table are split between
+# Rows whose states are the same modulo this share a lock, so updates to different rows rarely wait for each other
+DefaultNumberOfLocks = 64
+
+# endregion
+
+# region Shared Arrays
+
+# Stores NumPy arrays in blocks of shared memory so every process that has a copy of the object uses the same values
+# When the object is sent to another process only the names of the blocks are sent and the process attaches to them
+class SharedArrays():
+
+    # Constructor that initialises the empty set of arrays
+    def __init__(self):
+        self.memories = {}
+        self.layouts = {}
+
+    # Creates an array in a new block of shared memory, filled with the value
+    def create(self, name, shape, dtype, fillValue):
+        size = max(int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize, 1)
+        self.memories[name] = shared_memory.SharedMemory(create=True, size=size)
+        self.layouts[name] = (tuple(shape), numpy.dtype(dtype).str)
+
+        array = self.get(name)
+        array.fill(fillValue)
+        return array
+
+    # Gets the array that uses the block of shared memory
+    def get(self, name):
+        shape, dtype = self.layouts[name]
+        return numpy.ndarray(shape, dtype=dtype, buffer=self.memories[name].buf)
+
+    # Closes the blocks, removing them when unlink is True
+    # All the arrays that use the blocks have to be deleted first
+    def close(self, unlink=False):
+        for memory in self.memories.values():
+            memory.close()
+            if (unlink):
+                memory.unlink()
+
+        self.memories = {}
+
+    def __getstate__(self):
+        return {'names': {name: memory.name for name, memory in self.memories.items()}, 'layouts': self.layouts}
+
+    def __setstate__(self, state):
+        self.layouts = state['layouts']
+        self.memories = {name: shared_memory.SharedMemory(name=memoryName) for name, memoryName in state['names'].items()}
+
+# endregion
+
+# region Shared Q-Table
+
+# Q-Table whose arrays are in shared memory, so actor processes learning at the same time all see each other's updates
+# The table has a fixed capacity as shared memory can't grow, and the rows are added by the SharedStateIndex
+# at the same time as their states so another process never finds a state whose row isn't ready
+class SharedQTable(qTable.QTable):
+
+    # Constructor that creates the shared arrays and the locks for the rows
+    def __init__(self, numberOfActions, capacity, numberOfLocks=DefaultNumberOfLocks):
+        self.numberOfActions = numberOfActions
+        self.capacity = capacity
+        self.sharedArrays = SharedArrays()
+
+        # Uses the same types as the local table
+        prototype = qTable.QTable(numberOfActions, 0)
+        for name in qTable.QTable.ArrayNames:
+            self.sharedArrays.create(name, (capacity, numberOfActions), getattr(prototype, name).dtype, 0)
+        for name in qTable.QTable.AggregateArrayNames:
+            self.sharedArrays.create(name, (capacity,), getattr(prototype, name).dtype, 0)
+
+        # Number of states in the table
+        self.sharedArrays.create('numberOfStates', (1,), numpy.int64, 0)
+
+        # The locks are made for the forked actor processes that share them
+        context = utilities.getForkContext()
+        self.locks = [context.Lock() for _ in range(0, numberOfLocks)]
+        self.__attachArrays()
+
+    # Sets the array attributes to the arrays in shared memory
+    def __attachArrays(self):
+        for name in qTable.QTable.ArrayNames + qTable.QTable.AggregateArrayNames:
+            setattr(self, name, self.sharedArrays.get(name))
+
+        self.stateCounter = self.sharedArrays.get('numberOfStates')
+
+    # The number of states is kept in shared memory so all the processes agree on it
+    @property
+    def numberOfStates(self):
+        return int(self.stateCounter[0])
+
+    # Rows are added by allocateState when the SharedStateIndex adds the state so this does nothing
+    def addState(self, order):
+        return
+
+    # Adds the row for a new state and returns its index
+    # The SharedStateIndex holds its lock while calling this so only one process adds a row at a time
+    def allocateState(self, order):
+        state = self.numberOfStates
+        if (state == self.capacity):
+            raise RuntimeError("The shared Q-Table is full, it has space for " + str(self.capacity) + " states")
+
+        self.initialiseState(state, order)
+        self.stateCounter[0] = state + 1
+
+        return state
+
+    # Gets the lock that has to be held while the row of the state is changed
+    def getLock(self, state):
+        return self.locks[state % len(self.locks)]
+
+    # Closes the shared memory, removing it when unlink is True
+    # The table can't be used afterwards
+    def close(self, unlink=False):
+        for name in qTable.QTable.ArrayNames + qTable.QTable.AggregateArrayNames:
+            setattr(self, name, None)
+        self.stateCounter = None
+
+        self.sharedArrays.close(unlink)
+
+    def __getstate__(self):
+        return {'numberOfActions': self.numberOfActions, 'capacity': self.capacity,
+                'sharedArrays': self.sharedArrays, 'locks': self.locks}
+
+    def __setstate__(self, state):
+        self.numberOfActions = state['numberOfActions']
+        self.capacity = state['capacity']
+        self.sharedArrays = state['sharedArrays']
+        self.locks = state['locks']
+        self.__attachArrays()
+
+# endregion
+
+# region Shared State Index
+
+# State index with the same methods as stateIndex.StateIndex, kept in shared memory for actor processes
+# The problems are stored in a hash table with open addressing, where a problem's ID is its slot in the table
+# Finding states doesn't take a lock, adding problems and states takes a single lock
+class SharedStateIndex():
+
+    # Constructor that creates the shared arrays for the given number of problems and the table's states
+    def __init__(self, table, keyLength, problemCapacity):
+        self.table = table
+        self.numberOfActions = table.numberOfActions
+        self.problemCapacity = problemCapacity
+        self.sharedArrays = SharedArrays()
+
+        # Twice as many slots as problems keeps the searches short
+        numberOfSlots = 2 * max(problemCapacity, 1)
+        self.sharedArrays.create('slotKeys', (numberOfSlots, keyLength), numpy.uint8, 0)
+        self.sharedArrays.create('slotUsed', (numberOfSlots,), numpy.int8, 0)
+        self.sharedArrays.create('roots', (numberOfSlots,), numpy.int32, -1)
+        self.sharedArrays.create('children', (table.capacity, self.numberOfActions), numpy.int32, -1)
+        self.sharedArrays.create('numberOfProblems', (1,), numpy.int64, 0)
+
+        self.lock = utilities.getForkContext().Lock()
+        self.__attachArrays()
+
+    # Sets the array attributes to the arrays in shared memory
+    def __attachArrays(self):
+        self.slotKeys = self.sharedArrays.get('slotKeys')
+        self.slotUsed = self.sharedArrays.get('slotUsed')
+        self.roots = self.sharedArrays.get('roots')
+        self.children = self.sharedArrays.get('children')
+        self.problemCounter = self.sharedArrays.get('numberOfProblems')
+
+    # region Problems
+
+    # Gets the slot of the problem, or the empty slot it would go in if it hasn't been added
+    # The key is written before the slot is marked as used, so a used slot always has its whole key
+    def __findSlot(self, problemKey):
+        slot = zlib.crc32(problemKey) % len(self.slotUsed)
+
+        while ((self.slotUsed[slot] == 1) and (self.slotKeys[slot].tobytes() != problemKey)):
+            slot = (slot + 1) % len(self.slotUsed)
+
+        return slot
+
+    # Gets the ID of the problem, adding it if it hasn't been seen before
+    def internProblem(self, problemKey):
+        slot = self.__findSlot(problemKey)
+        if (self.slotUsed[slot] == 1):
+            return slot
+
+        with self.lock:
+            # Another process might have added the problem since it was looked for
+            slot = self.__findSlot(problemKey)
+            if (self.slotUsed[slot] == 0):
+                if (self.problemCounter[0] == self.problemCapacity):
+                    raise RuntimeError("The shared state index is full, it has space for " + str(self.problemCapacity) + " problems")
+
+                self.slotKeys[slot] = numpy.frombuffer(problemKey, dtype=numpy.uint8)
+                self.slotUsed[slot] = 1
+                self.problemCounter[0] += 1
+
+        return slot
+
+    # Returns the number of problems interned
+    def getNumberOfProblems(self):
+        return int(self.problemCounter[0])
+
+    # endregion
+
+    # region States
+
+    # Gets the index of the state for the problem and ordering, or -1 if it hasn't been added
+    def findState(self, problemId, order):
+        state = int(self.roots[problemId])
+
+        for action in order:
+            if (state == -1):
+                break
+            state = int(self.children[state, action])
+
+        return state
+
+    # Gets the index of the state after doing the action in the given state, or -1 if it hasn't been added
+    def getChild(self, state, action):
+        if (state == -1):
+            return -1
+
+        return int(self.children[state, action])
+
+    # Adds the state for the empty ordering of the problem and returns its index
+    def addRoot(self, problemId):
+        with self.lock:
+            if (self.roots[problemId] == -1):
+                self.roots[problemId] = self.table.allocateState([])
+
+            return int(self.roots[problemId])
+
+    # Adds the state after doing the action in the given state and returns its index
+    # The actions done in the new state are the ones done in the given state plus the action
+    def addChild(self, state, action):
+        with self.lock:
+            if (self.children[state, action] == -1):
+                doneActions = numpy.flatnonzero(~self.table.valid[state]).tolist() + [action]
+                self.children[state, action] = self.table.allocateState(doneActions)
+
+            return int(self.children[state, action])
+
+    # Returns the number of states added
+    def getNumberOfStates(self):
+        return self.table.numberOfStates
+
+    # endregion
+
+    # region Copy
+
+    # Gets the index as arrays in the same format as stateIndex.StateIndex.getArrays
+    # The problems are given new IDs in slot order
+    def getArrays(self):
+        usedSlots = numpy.flatnonzero(self.slotUsed == 1)
+
+        return {'problemKeys': self.slotKeys[usedSlots].copy(), 'roots': self.roots[usedSlots].copy(),
+                'children': self.children[:self.getNumberOfStates()].ravel().copy()}
+
+    # Adds the problems and states stored in the arrays, which have to be in the stateIndex.StateIndex.getArrays format
+    # The table has to already have the rows of the states
+    def setArrays(self, arrays):
+        children = numpy.asarray(arrays['children'], dtype=numpy.int32).reshape(-1, self.numberOfActions)
+        self.children[:len(children)] = children
+
+        for problemKey, root in zip(numpy.ascontiguousarray(arrays['problemKeys']), arrays['roots']):
+            self.roots[self.internProblem(problemKey.tobytes())] = root
+
+    # Closes the shared memory, removing it when unlink is True
+    # The index can't be used afterwards
+    def close(self, unlink=False):
+        self.slotKeys, self.slotUsed, self.roots, self.children, self.problemCounter = None, None, None, None, None
+        self.sharedArrays.close(unlink)
+
+    def __getstate__(self):
+        return {'table': self.table, 'numberOfActions': self.numberOfActions, 'problemCapacity': self.problemCapacity,
+                'sharedArrays': self.sharedArrays, 'lock': self.lock}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__attachArrays()
+
+    # endregion
+
+# endregion
+
+# region Create
+
+# Copies a local state index and Q-Table into shared memory, with space for the extra problems and states given
+def createSharedTables(localIndex, localTable, keyLength, extraProblems, extraStates, numberOfLocks=DefaultNumberOfLocks):
+    numberOfStates = localTable.getNumberOfStates()
+
+    table = SharedQTable(localTable.numberOfActions, numberOfStates + extraStates, numberOfLocks)
+    for name, array in localTable.getArrays().items():
+        getattr(table, name)[:numberOfStates] = array
+    table.stateCounter[0] = numberOfStates
+    table.updateAggregates(slice(0, numberOfStates))
+
+    index = SharedStateIndex(table, keyLength, localIndex.getNumberOfProblems() + extraProblems)
+    index.setArrays(localIndex.getArrays())
+
+    return index, table
+
+# endregion
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import tempfile
+import evaluator
+import utilities
+
+# region Constants
+
+# Environment variable that turns the store on and gives where it is kept
+# The store is only used when this is set or a store is passed to bruteForce.setSolutionStore
+StorePathVariable = "SOLUTION_STORE_PATH"
+
+# endregion
+
+# region Canonical Problem
+
+# Sorts the points of the problem so that the same points in a different order give the same problem
+# Returns the sorted problem and the permutation, where sortedProblem[i] = problem[permutation[i]]
+def getCanonicalProblem(problem):
+    canonicalProblem, permutation, _ = utilities.getCanonicalProblem(problem)
+
+    return utilities.getProblemList(canonicalProblem), permutation.tolist()
+
+# Gets the key of the problem, which is a hash of the canonical problem and the evaluator backend and its version
+# The backend and version are included because different backends, or versions of the routing, can give different
+# optimal orderings
+def getProblemKey(canonicalProblem):
+    problemText = ";".join(",".join(str(value) for value in point) for point in canonicalProblem)
+    return hashlib.sha256((evaluator.getBackendName() + "|" + evaluator.getBackendVersion() + "|" + problemText).encode()).hexdigest()
+
+# endregion
+
+# region Solution Store
+
+# Stores the brute force solutions of problems on disk so they only ever need working out once
+# Each solution is a small file named after its problem's key, which is written to a temporary file
+# and then renamed so that many processes can use the store at once without seeing half written files
+class SolutionStore():
+
+    # Constructor that creates the store directory if it doesn't exist
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+
+    # Gets the file the solution of the problem is kept in
+    # The files are split into sub-directories by the start of the key so no directory gets too big
+    def __getFile(self, key):
+        return os.path.join(self.path, key[:2], key[2:] + ".json")
+
+    # Returns the stored solution to the problem as (order, success, reward), or None if it isn't stored
+    def get(self, problem):
+        canonicalProblem, permutation = getCanonicalProblem(problem)
+
+        try:
+            with open(self.__getFile(getProblemKey(canonicalProblem))) as solutionFile:
+                solution = json.load(solutionFile)
+        except (IOError, ValueError):
+            return None
+
+        # Converts the order back from the canonical problem to the problem given
+        order = [permutation[connection] for connection in solution['order']]
+        reward = (utilities.MaxRewardPerPoint * len(problem)) - solution['measure']
+
+        return order, solution['success'], reward
+
+    # Stores the solution to the problem
+    def put(self, problem, order, success, reward):
+        canonicalProblem, permutation = getCanonicalProblem(problem)
+        solutionFile = self.__getFile(getProblemKey(canonicalProblem))
+
+        # Converts the order to use the indexes of the canonical problem
+        inversePermutation = [0] * len(permutation)
+        for index in range(0, len(permutation)):
+            inversePermutation[permutation[index]] = index
+
+        solution = {'order': [inversePermutation[connection] for connection in order], 'success': success,
+                    'measure': (utilities.MaxRewardPerPoint * len(problem)) - reward}
+
+        # Writes to a temporary file and then renames it, which replaces any existing file in one step
+        os.makedirs(os.path.dirname(solutionFile), exist_ok=True)
+        fileDescriptor, temporaryFile = tempfile.mkstemp(dir=os.path.dirname(solutionFile), suffix=".tmp")
+        try:
+            with os.fdopen(fileDescriptor, "w") as openFile:
+                json.dump(solution, openFile)
+
+            os.replace(temporaryFile, solutionFile)
+        except BaseException:
+            os.remove(temporaryFile)
+            raise
+
+# Gets the store at the path in the environment variable, or None if it isn't set
+def getDefaultStore():
+    storePath = os.environ.get(StorePathVariable)
+
+    return SolutionStore(storePath) if (storePath) else None
+
+# endregion
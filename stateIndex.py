@@ -0,0 +1,173 @@
+import array
+import numpy
+
+# region State Index
+
+# Stores the index of every state (a problem and the connections ordered so far) that the agent has seen
+# Each problem is interned once to an integer ID and the orderings of each problem are stored as a trie
+# The trie is a flat array of child state indexes, so moving from a state to the state after an action is a
+# single array lookup rather than building and hashing the whole problem again
+class StateIndex():
+
+    # Constructor that initialises the empty index
+    def __init__(self, numberOfActions):
+        # Number of actions, and so children, each state has
+        self.numberOfActions = numberOfActions
+
+        # Maps each problem to its ID, and each problem ID to its key and the state index of its empty ordering (-1 if not added)
+        self.problemIds = {}
+        self.problemKeys = []
+        self.roots = array.array('i')
+
+        # Child state index of each state and action, -1 when the child hasn't been added
+        # The child of state s after action a is at s * numberOfActions + a
+        self.children = array.array('i')
+
+        # Number of states added
+        self.numberOfStates = 0
+
+    # region Problems
+
+    # Gets the ID of the problem, adding it if it hasn't been seen before
+    def internProblem(self, problemKey):
+        problemId = self.problemIds.get(problemKey)
+
+        if (problemId is None):
+            problemId = len(self.roots)
+            self.problemIds[problemKey] = problemId
+            self.problemKeys.append(problemKey)
+            self.roots.append(-1)
+
+        return problemId
+
+    # Gets the ID of the problem without adding it, or -1 if it hasn't been seen before
+    def findProblem(self, problemKey):
+        return self.problemIds.get(problemKey, -1)
+
+    # Returns the number of problems interned
+    def getNumberOfProblems(self):
+        return len(self.roots)
+
+    # endregion
+
+    # region States
+
+    # Gets the index of the state for the problem and ordering, or -1 if it hasn't been added
+    def findState(self, problemId, order):
+        state = self.roots[problemId]
+
+        for action in order:
+            if (state == -1):
+                break
+            state = self.children[(state * self.numberOfActions) + action]
+
+        return state
+
+    # Gets the index of the state after doing the action in the given state, or -1 if it hasn't been added
+    def getChild(self, state, action):
+        if (state == -1):
+            return -1
+
+        return self.children[(state * self.numberOfActions) + action]
+
+    # Gets the index of the state after doing each action in the state at the same position, with -1 where either
+    # the state or its child hasn't been added
+    def getChildren(self, states, actions):
+        states = numpy.asarray(states)
+        children = numpy.full(len(states), -1, dtype=numpy.int32)
+
+        seen = states != -1
+        children[seen] = numpy.frombuffer(self.children, dtype=numpy.int32)[(states[seen] * self.numberOfActions) + numpy.asarray(actions)[seen]]
+
+        return children
+
+    # Adds the state for the empty ordering of the problem and returns its index
+    def addRoot(self, problemId):
+        if (self.roots[problemId] == -1):
+            self.roots[problemId] = self.__newState()
+
+        return self.roots[problemId]
+
+    # Adds the state after doing the action in the given state and returns its index
+    def addChild(self, state, action):
+        childPosition = (state * self.numberOfActions) + action
+
+        if (self.children[childPosition] == -1):
+            self.children[childPosition] = self.__newState()
+
+        return self.children[childPosition]
+
+    # Creates a new state with no children and returns its index
+    def __newState(self):
+        self.children.extend([-1] * self.numberOfActions)
+        self.numberOfStates += 1
+
+        return self.numberOfStates - 1
+
+    # Returns the number of states added
+    def getNumberOfStates(self):
+        return self.numberOfStates
+
+    # Gets the states that were added from firstState onwards so they can be added to another index
+    # Returns the keys and states of the new roots, and the parent state, action and state of the other new states
+    def getNewStates(self, firstState):
+        roots = numpy.frombuffer(self.roots, dtype=numpy.int32)
+        newRoots = numpy.flatnonzero(roots >= firstState)
+
+        children = numpy.frombuffer(self.children, dtype=numpy.int32).reshape(-1, self.numberOfActions)
+        parents, actions = numpy.nonzero(children >= firstState)
+
+        return {'rootKeys': [self.problemKeys[problemId] for problemId in newRoots], 'rootStates': roots[newRoots],
+                'childParents': parents, 'childActions': actions, 'childStates': children[parents, actions]}
+
+    # Adds the states from another index's getNewStates, where the other index had the same states before them
+    # The states are added in order so each one gets the same index it has in the other index
+    def addNewStates(self, newStates):
+        newRoots = [(state, key, -1, -1) for key, state in zip(newStates['rootKeys'], newStates['rootStates'].tolist())]
+        newChildren = list(zip(newStates['childStates'].tolist(), [None] * len(newStates['childStates']),
+                               newStates['childParents'].tolist(), newStates['childActions'].tolist()))
+
+        for state, key, parent, action in sorted(newRoots + newChildren):
+            if (key is not None):
+                self.addRoot(self.internProblem(key))
+            else:
+                self.addChild(parent, action)
+
+    # Removes the states from firstState onwards so the states of another index can be added in their place
+    # The problems stay interned, but a problem whose empty ordering was removed has no states until it is added again
+    def removeStatesFrom(self, firstState):
+        del self.children[firstState * self.numberOfActions:]
+        self.numberOfStates = firstState
+
+        for states in (numpy.frombuffer(self.roots, dtype=numpy.int32), numpy.frombuffer(self.children, dtype=numpy.int32)):
+            states[states >= firstState] = -1
+
+    # endregion
+
+    # region Save and Load
+
+    # Gets a copy of the index as arrays so it can be saved
+    # The problem keys all have the same length so they are stored as the rows of a byte array in problem ID order
+    def getArrays(self):
+        keyLength = len(self.problemKeys[0]) if (len(self.problemKeys) > 0) else 0
+
+        return {'problemKeys': numpy.frombuffer(b"".join(self.problemKeys), dtype=numpy.uint8).reshape(len(self.problemKeys), keyLength),
+                'roots': numpy.frombuffer(self.roots, dtype=numpy.int32).copy(),
+                'children': numpy.frombuffer(self.children, dtype=numpy.int32).copy()}
+
+    # Replaces the index with the one stored in the arrays
+    def setArrays(self, arrays):
+        problemKeys = numpy.ascontiguousarray(arrays['problemKeys'])
+        self.problemKeys = [problemKey.tobytes() for problemKey in problemKeys]
+        self.problemIds = {problemKey: problemId for problemId, problemKey in enumerate(self.problemKeys)}
+
+        self.roots = array.array('i')
+        self.roots.frombytes(numpy.asarray(arrays['roots'], dtype=numpy.int32).tobytes())
+        self.children = array.array('i')
+        self.children.frombytes(numpy.asarray(arrays['children'], dtype=numpy.int32).tobytes())
+
+        self.numberOfStates = len(self.children) // self.numberOfActions
+
+    # endregion
+
+# endregion
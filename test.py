@@ -1,4 +1,4 @@
-import copt
+import evaluator
 import math
 import bruteForce
 import heuristics
@@ -20,7 +20,7 @@ print(result1, ":", result2)
 
 problem = [(452, 524, 1548, 488), (481, 566, 1461, 474), (568, 411, 1493, 538)]
 order = [1, 0]
-result = copt.evaluate(problem, order)
+result = evaluator.evaluate(problem, order)
 print(result)
 
 # # Permutes the problem so that the point with the smallest x index will be first etc
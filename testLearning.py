@@ -1,11 +1,6 @@
-import numpy
-import copt
 import matplotlib.pyplot as pyplot
-import heuristics
 import rlAgents
 import time
-import utilities
-import threading
 
 # region User Input
 
@@ -18,6 +13,23 @@ numberOfPoints = int(input("Please input the number of points to connect: "))
 # Allow the user to input the number of problems the agent will learn with
 numberToLearn = int(input("Please input the number of problems the RL Agent will learn with: "))
 
+# Allow the user to split the learning across multiple processes
+learnWorkers = int(input("Please input the number of processes the RL Agent will learn with: "))
+
+# If there are multiple processes, allow them to share one Q-Table rather than merging their changes
+if (learnWorkers > 1):
+    check = input("Do you want the processes to share one Q-Table (Y/N): ")
+    shareTable = check.lower() == "y"
+    batchSize = 1
+else:
+    shareTable = False
+
+    # With a single process, allow the agent to learn from several problems at once
+    batchSize = int(input("Please input the number of problems the RL Agent will learn with at once: "))
+
+# Allow the agent to replay the transitions it has stored after each action, so it needs fewer routed problems
+planningSteps = int(input("Please input the number of stored transitions the RL Agent will replay after each action: "))
+
 # Allows the user to reduce the state-space by rounding
 check = input("Do you want to reduce the state-space by rounding the problem (Y/N): ")
 
@@ -27,6 +39,10 @@ if (check.lower() == "y"):
 else:
     roundNum = 1
 
+# Allows the user to share what is learnt between problems that are translations or mirror images of each other
+check = input("Do you want to reduce the state-space by sharing symmetric problems (Y/N): ")
+reduceSymmetry = check.lower() == "y"
+
 # Allow the user to reduce the square that the problem coordinates have to be in
 check = input("Do you want to test on a smaller problem (Y/N): ")
 
@@ -36,23 +52,43 @@ if (check.lower() == "y"):
 else:
     squareSize = 0
 
+# Allow the user to start from an agent that was saved by an earlier run rather than learning from nothing
+check = input("Do you want to load a saved agent (Y/N): ")
+loadPath = input("What is the saved agent file: ") if (check.lower() == "y") else None
+
+# Allow the user to save the agent once it has finished learning
+check = input("Do you want to save the agent after learning (Y/N): ")
+savePath = input("What file do you want to save the agent to: ") if (check.lower() == "y") else None
+
 # endregion
 
 # region Learning
 
-# Initialise the Q-Learning agent
-qLearningAgent = rlAgents.QLearningAgent(numberOfPoints, roundNum)
+if (loadPath is not None):
+    # Load the Q-Learning agent, which keeps the rounding and symmetry it learnt with
+    qLearningAgent = rlAgents.QLearningAgent.load(loadPath)
+
+    if (qLearningAgent.points != numberOfPoints):
+        raise ValueError("The saved agent learnt with " + str(qLearningAgent.points) + " points")
+else:
+    # Initialise the Q-Learning agent
+    qLearningAgent = rlAgents.QLearningAgent(numberOfPoints, roundNum, reduceSymmetry)
 
 # Gets the start time
 startTime = time.time()
 
-# Allow the agent to learn
-qLearningAgent.learn(numberToLearn, squareSize)
+# Allow the agent to learn, unless it was loaded as a saved agent has already learnt
+if (loadPath is None):
+    qLearningAgent.learn(numberToLearn, squareSize, learnWorkers, shareTable=shareTable, batchSize=batchSize, planningSteps=planningSteps)
 
 # Gets the time after the learning has finished and calculates how long the learning took
 timeTaken = time.time() - startTime
 print("Learning took", timeTaken, "seconds")
 
+# Saves the agent so later runs can start from it
+if (savePath is not None):
+    qLearningAgent.save(savePath)
+
 # endregion
 
 # region Testing
@@ -61,7 +97,7 @@ print("Learning took", timeTaken, "seconds")
 midTime = time.time()
 
 # Allow the agent to learn
-qLearningAgent.learn(numberToTest, squareSize)
+qLearningAgent.learn(numberToTest, squareSize, learnWorkers, shareTable=shareTable, batchSize=batchSize, planningSteps=planningSteps)
 
 # Gets the time after the testing has finished and calculates how long the testing took
 timeTaken = time.time() - midTime
@@ -78,9 +114,9 @@ print("The total time that the program took, in seconds, was", timeTaken)
 # Gets the successes and rewards
 successes, rewards = qLearningAgent.getLearnValues()
 
-# Just get the values that we are testing with
-successes = successes[numberToLearn:]
-rewards = rewards[numberToLearn:]
+# Just get the values that we are testing with, which are the last ones as a loaded agent has its earlier values too
+successes = successes[len(successes) - numberToTest:]
+rewards = rewards[len(rewards) - numberToTest:]
 
 # Print the number of successes
 print("Number of Successes: ", successes.count(1))
@@ -1,12 +1,13 @@
 import numpy
-import copt
+import evaluator
 import matplotlib.pyplot as pyplot
 import heuristics
 import rlAgents
 import time
 import utilities
-import threading
+import scheduler
 import bruteForce
+import solutionStore
 
 # region User Input
 
@@ -17,6 +18,23 @@ numberOfPoints = int(input("Please input the number of points to connect: "))
 # Allow the user to input the number of problems the agent will learn with
 numberToLearn = int(input("Please input the number of problems the RL Agent will learn with: "))
 
+# Allow the user to split the learning across multiple processes
+learnWorkers = int(input("Please input the number of processes the RL Agent will learn with: "))
+
+# If there are multiple processes, allow them to share one Q-Table rather than merging their changes
+if (learnWorkers > 1):
+    check = input("Do you want the processes to share one Q-Table (Y/N): ")
+    shareTable = check.lower() == "y"
+    batchSize = 1
+else:
+    shareTable = False
+
+    # With a single process, allow the agent to learn from several problems at once
+    batchSize = int(input("Please input the number of problems the RL Agent will learn with at once: "))
+
+# Allow the agent to replay the transitions it has stored after each action, so it needs fewer routed problems
+planningSteps = int(input("Please input the number of stored transitions the RL Agent will replay after each action: "))
+
 # Allows the user to reduce the state-space by rounding
 check = input("Do you want to reduce the state-space by rounding the problem (Y/N): ")
 
@@ -26,6 +44,10 @@ if (check.lower() == "y"):
 else:
     roundNum = 1
 
+# Allows the user to share what is learnt between problems that are translations or mirror images of each other
+check = input("Do you want to reduce the state-space by sharing symmetric problems (Y/N): ")
+reduceSymmetry = check.lower() == "y"
+
 # Allow the user to reduce the square that the problem coordinates have to be in
 check = input("Do you want to test on a smaller problem (Y/N): ")
 
@@ -35,23 +57,48 @@ if (check.lower() == "y"):
 else:
     squareSize = 0
 
+# Allow the user to keep the brute force solutions on disk so later runs don't have to work them out again
+check = input("Do you want to keep the brute force solutions in a solution store (Y/N): ")
+if (check.lower() == "y"):
+    bruteForce.setSolutionStore(solutionStore.SolutionStore(input("What is the solution store directory: ")))
+
+# Allow the user to start from an agent that was saved by an earlier run rather than learning from nothing
+check = input("Do you want to load a saved agent (Y/N): ")
+loadPath = input("What is the saved agent file: ") if (check.lower() == "y") else None
+
+# Allow the user to save the agent once it has finished learning
+check = input("Do you want to save the agent after learning (Y/N): ")
+savePath = input("What file do you want to save the agent to: ") if (check.lower() == "y") else None
+
 # endregion
 
 # region Learning
 
-# Initialise the Q-Learning agent
-qLearningAgent = rlAgents.QLearningAgent(numberOfPoints, roundNum)
+if (loadPath is not None):
+    # Load the Q-Learning agent, which keeps the rounding and symmetry it learnt with
+    qLearningAgent = rlAgents.QLearningAgent.load(loadPath)
+
+    if (qLearningAgent.points != numberOfPoints):
+        raise ValueError("The saved agent learnt with " + str(qLearningAgent.points) + " points")
+else:
+    # Initialise the Q-Learning agent
+    qLearningAgent = rlAgents.QLearningAgent(numberOfPoints, roundNum, reduceSymmetry)
 
 # Gets the start time
 startTime = time.time()
 
-# Allow the agent to learn
-qLearningAgent.learn(numberToLearn, squareSize)
+# Allow the agent to learn, unless it was loaded as a saved agent has already learnt
+if (loadPath is None):
+    qLearningAgent.learn(numberToLearn, squareSize, learnWorkers, shareTable=shareTable, batchSize=batchSize, planningSteps=planningSteps)
 
 # Gets the time after the learning has finished and calculates how long the learning took
 timeTaken = time.time() - startTime
 print("Learning took", timeTaken, "seconds")
 
+# Saves the agent so later runs can start from it
+if (savePath is not None):
+    qLearningAgent.save(savePath)
+
 # endregion
 
 # region Testing
@@ -72,68 +119,64 @@ hillClimbSuccesses = 0
 simAnnealSuccesses = 0
 qLearnSuccesses = 0
 
+# Gets whether each of the heuristics found a successful ordering of the problem
 def getSolutions(givenProblem):
-    # Define all the variables as global
-    global manhatSuccesses
-    global randSuccesses
-    global hillClimbSuccesses
-    global simAnnealSuccesses
-    global qLearnSuccesses
-
     # Gets the heuristic solutions to the problem
     _, manhatSuccess, _ = manhat.getSolution(givenProblem)
     _, randSuccess, _ = rand.getSolution(givenProblem)
     _, hillClimbSuccess, _ = hillClimb.getSolution(givenProblem)
     _, simAnnealSuccess, _ = simAnneal.getSolution(givenProblem)
 
-    # Gets the RL Agent solution to the problem
-    _, qLearnSuccess, _ = qLearningAgent.getSolution(givenProblem)
+    return manhatSuccess, randSuccess, hillClimbSuccess, simAnnealSuccess
 
-    # Change the counters with a lock to prevent multiple threads changing the values at the same time
-    threading.Lock().acquire()
-    try:
-        manhatSuccesses += manhatSuccess
-        randSuccesses += randSuccess
-        hillClimbSuccesses += hillClimbSuccess
-        simAnnealSuccesses += simAnnealSuccess
-        qLearnSuccesses += qLearnSuccess
+# Adds the successes of a problem to the counters and outputs the percentage complete
+# The scheduler only calls this for one problem at a time so the counters can be changed without a lock
+def addSuccesses(taskNumber, successes):
+    # Define all the variables as global
+    global manhatSuccesses
+    global randSuccesses
+    global hillClimbSuccesses
+    global simAnnealSuccesses
 
-        threading.Lock().release()
-    except RuntimeError:
-        pass
+    manhatSuccess, randSuccess, hillClimbSuccess, simAnnealSuccess = successes
+    manhatSuccesses += manhatSuccess
+    randSuccesses += randSuccess
+    hillClimbSuccesses += hillClimbSuccess
+    simAnnealSuccesses += simAnnealSuccess
 
-    return
+    utilities.outputPercentageComplete(testScheduler.completedTasks, numberOfProblems, qLearningAgent.getNumberOfReseenProblems())
 
 
 print("Testing Started")
 
-for x in range(0, numberOfProblems):
-    validProblem = False
-
-    while (validProblem is False):
-        # Get the random problem
-        problem = copt.getProblem(numberOfPoints) if squareSize == 0 else utilities.generateSmallerProblem(numberOfPoints, squareSize)
+# Gets the heuristic solutions on a pool of threads, where getting the next problem waits while the pool is busy
+# The random problems are made in batches as they are needed, and are always valid
+problems = []
+problemSource = evaluator.iterateProblems(numberOfPoints, squareSize)
 
-        # Checks whether the problem is valid
-        validProblem = utilities.checkValidProblem(problem) if squareSize == 0 else True
+with scheduler.Scheduler(callback=addSuccesses) as testScheduler:
+    for x in range(0, numberOfProblems):
+        validProblem = False
 
-        if (validProblem is True):
-            # Gets the brute force solution to the problem
-            _, bruteSuccess, _ = bruteForce.getSolution(problem)
+        while (validProblem is False):
+            # Get the random problem
+            problem = next(problemSource)
 
-            # If the brute force was unsuccessful then ignore the problem
-            validProblem = False if bruteSuccess == 0 else True
+            # Checks whether any ordering of the problem is successful
+            # If there isn't one then ignore the problem
+            validProblem = bruteForce.findFeasibleOrder(problem) is not None
 
-    # Gets the solutions to the problem in a separate thread
-    thread = threading.Thread(target=getSolutions, args=(problem,))
-    thread.start()
+        # Gets the heuristic solutions to the problem on the pool
+        problems.append(problem)
+        testScheduler.submit(getSolutions, problem)
 
-    outputThread = threading.Thread(target=utilities.outputPercentageComplete, args=(x + 1, numberOfProblems, qLearningAgent.getNumberOfReseenProblems(),))
-    outputThread.start()
+    # Waits for all the problems to be solved
+    testScheduler.join()
 
-while (thread.is_alive() or outputThread.is_alive()):
-    # Waits for all threads to be completed
-    pass
+# Gets the RL Agent solutions to all the problems at once on this thread
+# The batch doesn't change what the agent has learnt, so every problem is solved by the same agent
+for _, qLearnSuccess, _ in qLearningAgent.getSolutions(problems):
+    qLearnSuccesses += qLearnSuccess
 
 print("Testing Finished")
 
@@ -1,12 +1,14 @@
 import numpy
-import copt
+import evaluator
 import matplotlib.pyplot as pyplot
 import bruteForce
+import problemCorpus
+import solutionStore
 import heuristics
 import rlAgents
 import time
 import utilities
-import threading
+import scheduler
 
 # region User Input
 
@@ -17,6 +19,23 @@ numberOfPoints = int(input("Please input the number of points to connect: "))
 # Allow the user to input the number of problems the agent will learn with
 numberToLearn = int(input("Please input the number of problems the RL Agent will learn with: "))
 
+# Allow the user to split the learning across multiple processes
+learnWorkers = int(input("Please input the number of processes the RL Agent will learn with: "))
+
+# If there are multiple processes, allow them to share one Q-Table rather than merging their changes
+if (learnWorkers > 1):
+    check = input("Do you want the processes to share one Q-Table (Y/N): ")
+    shareTable = check.lower() == "y"
+    batchSize = 1
+else:
+    shareTable = False
+
+    # With a single process, allow the agent to learn from several problems at once
+    batchSize = int(input("Please input the number of problems the RL Agent will learn with at once: "))
+
+# Allow the agent to replay the transitions it has stored after each action, so it needs fewer routed problems
+planningSteps = int(input("Please input the number of stored transitions the RL Agent will replay after each action: "))
+
 # Allows the user to reduce the state-space by rounding
 check = input("Do you want to reduce the state-space by rounding the problem (Y/N): ")
 
@@ -26,6 +45,10 @@ if (check.lower() == "y"):
 else:
     roundNum = 1
 
+# Allows the user to share what is learnt between problems that are translations or mirror images of each other
+check = input("Do you want to reduce the state-space by sharing symmetric problems (Y/N): ")
+reduceSymmetry = check.lower() == "y"
+
 # Allow the user to reduce the square that the problem coordinates have to be in
 check = input("Do you want to test on a smaller problem (Y/N): ")
 
@@ -35,23 +58,67 @@ if (check.lower() == "y"):
 else:
     squareSize = 0
 
+# Allow the user to test on a corpus of problems that have already been solved
+check = input("Do you want to test on a problem corpus (Y/N): ")
+
+# If the user wants to use a corpus, need to know where it is
+if (check.lower() == "y"):
+    corpus = problemCorpus.ProblemCorpus(input("What is the corpus directory: "))
+
+    # The agent learns from problems made with the same settings, so the corpus has to have been built with them too
+    corpus.checkSettings(numberOfPoints, squareSize, evaluator.getBackendName())
+
+    numberOfProblems = min(numberOfProblems, len(corpus))
+    numberOfWorkers = 1
+else:
+    corpus = None
+
+    # Allow the user to split the brute force solutions across multiple processes
+    # The processes are started by forking, which isn't available on Windows, so use 1 process there
+    numberOfWorkers = int(input("Please input the number of processes to use for the brute force solutions: "))
+
+    # Allow the user to keep the brute force solutions on disk so later runs don't have to work them out again
+    check = input("Do you want to keep the brute force solutions in a solution store (Y/N): ")
+    if (check.lower() == "y"):
+        bruteForce.setSolutionStore(solutionStore.SolutionStore(input("What is the solution store directory: ")))
+
+# Allow the user to start from an agent that was saved by an earlier run rather than learning from nothing
+check = input("Do you want to load a saved agent (Y/N): ")
+loadPath = input("What is the saved agent file: ") if (check.lower() == "y") else None
+
+# Allow the user to save the agent once it has finished learning
+check = input("Do you want to save the agent after learning (Y/N): ")
+savePath = input("What file do you want to save the agent to: ") if (check.lower() == "y") else None
+
 # endregion
 
 # region Learning
 
-# Initialise the Q-Learning agent
-qLearningAgent = rlAgents.QLearningAgent(numberOfPoints, roundNum)
+if (loadPath is not None):
+    # Load the Q-Learning agent, which keeps the rounding and symmetry it learnt with
+    qLearningAgent = rlAgents.QLearningAgent.load(loadPath)
+
+    if (qLearningAgent.points != numberOfPoints):
+        raise ValueError("The saved agent learnt with " + str(qLearningAgent.points) + " points")
+else:
+    # Initialise the Q-Learning agent
+    qLearningAgent = rlAgents.QLearningAgent(numberOfPoints, roundNum, reduceSymmetry)
 
 # Gets the start time
 startTime = time.time()
 
-# Allow the agent to learn
-qLearningAgent.learn(numberToLearn, squareSize)
+# Allow the agent to learn, unless it was loaded as a saved agent has already learnt
+if (loadPath is None):
+    qLearningAgent.learn(numberToLearn, squareSize, learnWorkers, shareTable=shareTable, batchSize=batchSize, planningSteps=planningSteps)
 
 # Gets the time after the learning has finished and calculates how long the learning took
 timeTaken = time.time() - startTime
 print("Learning took", timeTaken, "seconds")
 
+# Saves the agent so later runs can start from it
+if (savePath is not None):
+    qLearningAgent.save(savePath)
+
 # endregion
 
 # region Testing
@@ -91,44 +158,62 @@ bruteOrders = [[-1] * numberOfPoints] * numberOfProblems
 bruteSuccesses = [-1] * numberOfProblems
 bruteRewards = [-1] * numberOfProblems
 
+# Gets the heuristic solutions to the problem
+def getSolutions(givenProblem):
+    return (manhat.getSolution(givenProblem), rand.getSolution(givenProblem), hillClimb.getSolution(givenProblem),
+            simAnneal.getSolution(givenProblem))
+
+# Stores the solutions to a problem and outputs the percentage complete
+# A problem's task number is its index as there is one task per problem, in order
+def storeSolutions(taskNumber, solutions):
+    manhatSolution, randSolution, hillClimbSolution, simAnnealSolution = solutions
+
+    manhatOrders[taskNumber], manhatSuccesses[taskNumber], manhatRewards[taskNumber] = manhatSolution
+    randOrders[taskNumber], randSuccesses[taskNumber], randRewards[taskNumber] = randSolution
+    hillClimbOrders[taskNumber], hillClimbSuccesses[taskNumber], hillClimbRewards[taskNumber] = hillClimbSolution
+    simAnnealOrders[taskNumber], simAnnealSuccesses[taskNumber], simAnnealRewards[taskNumber] = simAnnealSolution
+
+    utilities.outputPercentageComplete(testScheduler.completedTasks, numberOfProblems, qLearningAgent.getNumberOfReseenProblems())
+
 print("Testing Started")
 
+# Gets the problems and their brute force solutions before the pool of threads is started
+# The brute force solutions can start processes, which isn't safe while other threads are running
+problems = [None] * numberOfProblems
+
+# The random problems are made in batches as they are needed, and are always valid
+problemSource = evaluator.iterateProblems(numberOfPoints, squareSize)
+
 for x in range(0, numberOfProblems):
-    validProblem = False
+    # If there's a corpus then the problem and its brute force solution are read from it
+    if (corpus is not None):
+        problems[x], bruteOrders[x], bruteSuccesses[x], bruteRewards[x] = corpus[x]
+
+    validProblem = corpus is not None
 
     while (validProblem is False):
         # Get the random problem
-        problem = copt.getProblem(numberOfPoints) if squareSize == 0 else utilities.generateSmallerProblem(
-            numberOfPoints, squareSize)
-
-        # Checks whether the problem is valid
-        validProblem = utilities.checkValidProblem(problem) if squareSize == 0 else True
-
-        if (validProblem is True):
-            # Gets the brute force solution to the problem
-            # This is used a baseline to see how close to the correct solution the RL Agent is
-            bruteOrders[x], bruteSuccesses[x], bruteRewards[x] = bruteForce.getSolution(problem)
+        problems[x] = next(problemSource)
 
-            # If the brute force was unsuccessful then ignore the problem
-            validProblem = False if bruteSuccesses[x] == 0 else True
+        # Gets the brute force solution to the problem
+        # This is used a baseline to see how close to the correct solution the RL Agent is
+        bruteOrders[x], bruteSuccesses[x], bruteRewards[x] = bruteForce.getSolution(problems[x], numberOfWorkers)
 
-    # Gets the heuristic solutions to the problem
-    manhatOrders[x], manhatSuccesses[x], manhatRewards[x] = manhat.getSolution(problem)
-    randOrders[x], randSuccesses[x], randRewards[x] = rand.getSolution(problem)
-    hillClimbOrders[x], hillClimbSuccesses[x], hillClimbRewards[x] = hillClimb.getSolution(problem)
-    simAnnealOrders[x], simAnnealSuccesses[x], simAnnealRewards[x] = simAnneal.getSolution(problem)
+        # If the brute force was unsuccessful then ignore the problem
+        validProblem = False if bruteSuccesses[x] == 0 else True
 
-    # Gets the RL Agent solution to the problem
-    qLearnOrders[x], qLearnSuccesses[x], qLearnRewards[x] = qLearningAgent.getSolution(problem)
+# Gets the heuristic solutions on a pool of threads, where submitting waits while the pool is busy
+with scheduler.Scheduler(callback=storeSolutions) as testScheduler:
+    for problem in problems:
+        testScheduler.submit(getSolutions, problem)
 
-    # Starts the thread to output the percentage complete
-    outputThread = threading.Thread(target=utilities.outputPercentageComplete,
-                                    args=(x + 1, numberOfProblems, qLearningAgent.getNumberOfReseenProblems(),))
-    outputThread.start()
+    # Waits for all the problems to be solved
+    testScheduler.join()
 
-while (outputThread.is_alive()):
-    # Waits for all threads to be completed
-    pass
+# Gets the RL Agent solutions to all the problems at once on this thread
+# The batch doesn't change what the agent has learnt, so every problem is solved by the same agent
+for x, qLearnSolution in enumerate(qLearningAgent.getSolutions(problems)):
+    qLearnOrders[x], qLearnSuccesses[x], qLearnRewards[x] = qLearnSolution
 
 print("Testing Finished")
 
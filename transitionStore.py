@@ -0,0 +1,153 @@
+import heapq
+import numpy
+
+# region Constants
+
+# Number of transitions the store has space for when it is created
+InitialCapacity = 1024
+
+# endregion
+
+# region Transition Store
+
+# Stores the transitions the agent has seen when learning so they can be replayed without routing the problem again
+# There is one transition for each state and action, kept in NumPy arrays where its position is its index
+# The reward of a transition is the average of every reward seen for its state and action, as problems that are
+# rounded to the same state can give different rewards
+# Transitions are queued by priority, the size of the change replaying them would make, so the largest is replayed first
+class TransitionStore():
+
+    # Constructor that allocates the empty arrays
+    def __init__(self, capacity=InitialCapacity):
+        # Number of transitions stored, and the position of the transition of each state and action
+        self.numberOfTransitions = 0
+        self.positions = {}
+
+        # The state and action of each transition, the average reward and number of rewards it is the average of,
+        # the success of doing the action, the state the action leads to (-1 if it hadn't been added when the
+        # transition was stored) and whether it is the last action
+        self.states = numpy.zeros(capacity, dtype=numpy.int64)
+        self.actions = numpy.zeros(capacity, dtype=numpy.int64)
+        self.rewards = numpy.zeros(capacity)
+        self.rewardCounts = numpy.zeros(capacity, dtype=numpy.int64)
+        self.successes = numpy.zeros(capacity, dtype=numpy.int8)
+        self.nextStates = numpy.zeros(capacity, dtype=numpy.int64)
+        self.lastActions = numpy.zeros(capacity, dtype=bool)
+
+        # The priority each transition is queued with, which is 0 when it isn't queued
+        # The queue is a heap of negative priorities and positions, where entries whose priority has since changed are skipped
+        self.priorities = numpy.zeros(capacity)
+        self.queue = []
+
+        # Position of the transition that leads to each state, so it can be queued again when the state changes
+        self.predecessors = {}
+
+    # Names of the arrays that have one value per transition
+    ArrayNames = ('states', 'actions', 'rewards', 'rewardCounts', 'successes', 'nextStates', 'lastActions', 'priorities')
+
+    # region Transitions
+
+    # Stores the transition, adding the reward to the average of the one with the same state and action, and returns its position
+    def add(self, state, action, reward, success, nextState, lastAction):
+        position = self.positions.get((state, action))
+
+        if (position is None):
+            if (self.numberOfTransitions == len(self.states)):
+                self.__grow()
+
+            position = self.numberOfTransitions
+            self.numberOfTransitions += 1
+            self.positions[(state, action)] = position
+
+        self.states[position] = state
+        self.actions[position] = action
+        self.rewardCounts[position] += 1
+        self.rewards[position] += (reward - self.rewards[position]) / self.rewardCounts[position]
+        self.successes[position] = success
+        self.lastActions[position] = lastAction
+        self.setNextState(position, nextState)
+
+        return position
+
+    # Sets the state the transition leads to, once it has been added
+    def setNextState(self, position, nextState):
+        self.nextStates[position] = nextState
+
+        if (nextState != -1):
+            self.predecessors[nextState] = position
+
+    # Gets the state, action, reward, success, next state and whether it is the last action of the transition
+    def get(self, position):
+        return (int(self.states[position]), int(self.actions[position]), float(self.rewards[position]),
+                int(self.successes[position]), int(self.nextStates[position]), bool(self.lastActions[position]))
+
+    # Gets the position of the transition that leads to the state, or -1 if there isn't one
+    def getPredecessor(self, state):
+        return self.predecessors.get(state, -1)
+
+    # Returns the number of transitions stored
+    def getNumberOfTransitions(self):
+        return self.numberOfTransitions
+
+    # Removes the transitions of the states from firstState onwards, and forgets the states from firstState onwards
+    # that the other transitions lead to, as those states are being replaced by another learner's
+    def discardStates(self, firstState):
+        kept = numpy.flatnonzero(self.states[:self.numberOfTransitions] < firstState)
+
+        for name in TransitionStore.ArrayNames:
+            array = getattr(self, name)
+            array[:len(kept)] = array[kept]
+        self.numberOfTransitions = len(kept)
+
+        nextStates = self.nextStates[:self.numberOfTransitions]
+        nextStates[nextStates >= firstState] = -1
+
+        # Rebuilds the lookups and the queue from the transitions that are left
+        states = self.states[:self.numberOfTransitions].tolist()
+        actions = self.actions[:self.numberOfTransitions].tolist()
+        self.positions = {(state, action): position for position, (state, action) in enumerate(zip(states, actions))}
+        self.predecessors = {nextState: position for position, nextState in enumerate(nextStates.tolist()) if (nextState != -1)}
+
+        priorities = self.priorities[:self.numberOfTransitions].tolist()
+        self.queue = [(-priority, position) for position, priority in enumerate(priorities) if (priority > 0)]
+        heapq.heapify(self.queue)
+
+    # Doubles the number of transitions the arrays have space for
+    def __grow(self):
+        for name in TransitionStore.ArrayNames:
+            array = getattr(self, name)
+            grownArray = numpy.zeros(max(2 * len(array), InitialCapacity), dtype=array.dtype)
+            grownArray[:len(array)] = array
+            setattr(self, name, grownArray)
+
+    # endregion
+
+    # region Queue
+
+    # Queues the transition with the priority, or takes it out of the queue if the priority is 0
+    def setPriority(self, position, priority):
+        # The transition is only added to the heap if it isn't already in the queue with the same priority
+        if ((priority > 0) and (priority != self.priorities[position])):
+            heapq.heappush(self.queue, (-priority, position))
+
+        self.priorities[position] = priority
+
+    # Takes the transition with the highest priority out of the queue and returns its position, or -1 if the queue is empty
+    def popHighest(self):
+        while (len(self.queue) > 0):
+            negativePriority, position = heapq.heappop(self.queue)
+
+            # Skips the entry if the transition has been queued again since or taken out of the queue
+            if (self.priorities[position] == -negativePriority):
+                self.priorities[position] = 0
+                return position
+
+        return -1
+
+    # Returns the number of transitions in the queue
+    def getNumberOfQueued(self):
+        return int(numpy.count_nonzero(self.priorities[:self.numberOfTransitions]))
+
+    # endregion
+
+# endregion
@@ -1,35 +1,42 @@
+import multiprocessing
 import numpy
-import math
 import random
+import sys
 
 # region Constants
 
 # Constant for the max reward value per point
 MaxRewardPerPoint = 2000
 
+# Constant for the minimum distance allowed between two points
+MinimumPointDistance = 15
+
+# Centres of the squares that the first and second coordinates of generated problems are in
+FirstSquareCentre = (500, 500)
+SecondSquareCentre = (1500, 500)
+
+# Number of times a point can be redrawn before the square is treated as too small for the problem
+MaxPointAttempts = 1000
+
 # endregion
 
 # region Check Valid Problem
 
 # Checks whether the problem passed in is valid
 # Does this by checking whether each point is at least 15 units away from each other point
+# The distances between every pair of points are worked out at once with NumPy
 def checkValidProblem(problem):
-    # Gets the number of points
-    numberOfPoints = len(problem)
+    points = numpy.asarray(problem, dtype=float).reshape(-1, 4)
+    numberOfPoints = len(points)
 
-    for index1 in range(0, numberOfPoints):
-        for index2 in range(0, numberOfPoints):
-            if (index1 != index2):
-                # Gets the distance between the points
-                firstPointLength = math.sqrt((abs(problem[index1][0] - problem[index2][0]) ** 2) + (abs(problem[index1][1] - problem[index2][1]) ** 2))
-                secondPointLength = math.sqrt((abs(problem[index1][2] - problem[index2][2]) ** 2) + (abs(problem[index1][3] - problem[index2][3]) ** 2))
+    # Gets the distances between all the first coordinates and between all the second coordinates
+    firstDistances = numpy.hypot(points[:, None, 0] - points[None, :, 0], points[:, None, 1] - points[None, :, 1])
+    secondDistances = numpy.hypot(points[:, None, 2] - points[None, :, 2], points[:, None, 3] - points[None, :, 3])
 
-                # Checks whether the points are 15 units apart
-                if ((firstPointLength < 15) or (secondPointLength < 15)):
-                    return False
+    # A point is always 0 units from itself so those distances are ignored
+    offDiagonal = ~numpy.eye(numberOfPoints, dtype=bool)
 
-    # All problems checked and are valid so return true
-    return True
+    return bool(numpy.all(firstDistances[offDiagonal] >= MinimumPointDistance) and numpy.all(secondDistances[offDiagonal] >= MinimumPointDistance))
 
 # endregion
 
@@ -73,102 +80,169 @@ def getPossibleNeighbourSolution(currentSolution):
     # Return the new order
     return newOrder
 
+# Splits the list into chunks of at most chunkSize elements
+# This is used to submit neighbourhoods to the evaluator in batches
+def getChunks(items, chunkSize):
+    for index in range(0, len(items), chunkSize):
+        yield items[index:index + chunkSize]
+
 # endregion
 
-# region Generate Smaller Problem
+# region Generate Problems
+
+# Gets a NumPy random generator from a seed, or returns the generator if one was passed in
+def getRandomGenerator(seed=None):
+    if (isinstance(seed, numpy.random.Generator)):
+        return seed
+
+    return numpy.random.default_rng(seed)
 
-# Initialises the problem array
-def generateSmallerProblem(numberOfPoints, squareSize):
-    problem = []
+# Generates a batch of valid problems with any number of points as an array of shape (numberOfProblems, numberOfPoints, 4)
+# The first coordinates are in a square around FirstSquareCentre and the second coordinates in a square around SecondSquareCentre
+# Points are drawn for all the problems at once and only the ones that are too close to a previous point are redrawn
+def generateProblems(numberOfProblems, numberOfPoints, squareSize, seed=None):
+    generator = getRandomGenerator(seed)
+    halfSize = squareSize // 2
 
-    # return [(480, 480, 1481, 481), (519, 479, 1520, 480), (500, 520, 1501, 521)]
+    lowValues = numpy.array([FirstSquareCentre[0], FirstSquareCentre[1], SecondSquareCentre[0], SecondSquareCentre[1]]) - halfSize
+    highValues = lowValues + (2 * halfSize) + 1
+
+    problems = numpy.zeros((numberOfProblems, numberOfPoints, 4), dtype=numpy.int64)
 
     for point in range(0, numberOfPoints):
-        problem.append((0, 0, 0, 0))
-
-        validPoint = False
-        while (validPoint is False):
-            # Gets the first coordinate that's within the sqaure
-            # point1 = random.randint(500 - (squareSize / 2), 500 + (squareSize / 2))
-            # point2 = random.randint(500 - (squareSize / 2), 500 + (squareSize / 2))
-            # point1 = random.randint(50 - (squareSize / 20), 50 + (squareSize / 20)) * 10
-            # point2 = random.randint(50 - (squareSize / 20), 50 + (squareSize / 20)) * 10
-            if (numberOfPoints == 3):
-                if (point == 0):
-                    point1 = random.randint(487 - squareSize, 487 + squareSize)
-                    point2 = point1
-
-                    point3 = random.randint(1487 - squareSize, 1487 + squareSize)
-                    point4 = point3 - 1000
-                elif (point == 1):
-                    point1 = random.randint(513 - squareSize, 513 + squareSize)
-                    point2 = point1 - 26
-
-                    point3 = random.randint(1513 - squareSize, 1513 + squareSize)
-                    point4 = point3 - 1026
-                else:
-                    point1 = random.randint(500 - squareSize, 500 + squareSize)
-                    point2 = point1 + 13
-
-                    point3 = random.randint(1500 - squareSize, 1500 + squareSize)
-                    point4 = point3 - 987
-            elif (numberOfPoints == 7):
-                if (point == 0):
-                    point1 = random.randint(500 - squareSize, 500)
-                    point2 = point1 + 50
-
-                    point3 = random.randint(1500 - squareSize, 1500)
-                    point4 = point3 - 950
-                elif (point == 1):
-                    point1 = random.randint(530 - squareSize, 530)
-                    point2 = point1 - 15
-
-                    point3 = random.randint(1530 - squareSize, 1530)
-                    point4 = point3 - 1015
-                elif (point == 2):
-                    point1 = random.randint(530 - squareSize, 530)
-                    point2 = point1 - 50
-
-                    point3 = random.randint(1530 - squareSize, 1530)
-                    point4 = point3 - 1050
-                elif (point == 3):
-                    point1 = random.randint(510 - squareSize, 510)
-                    point2 = point1 - 60
-
-                    point3 = random.randint(1510 - squareSize, 1510)
-                    point4 = point3 - 1060
-                elif (point == 4):
-                    point1 = random.randint(490 - squareSize, 490)
-                    point2 = point1 - 40
-
-                    point3 = random.randint(1490 - squareSize, 1490)
-                    point4 = point3 - 1040
-                elif (point == 5):
-                    point1 = random.randint(470 - squareSize, 470)
-                    point2 = point1 + 10
-
-                    point3 = random.randint(1470 - squareSize, 1470)
-                    point4 = point3 - 990
-                elif (point == 6):
-                    point1 = random.randint(470 - squareSize, 470)
-                    point2 = point1 + 45
-
-                    point3 = random.randint(1470 - squareSize, 1470)
-                    point4 = point3 - 965
-
-            # Gets the second coordiante that's within the square
-            # point3 = random.randint(1500 - (squareSize / 2), 1500 + (squareSize / 2))
-            # point4 = random.randint(500 - (squareSize / 2), 500 + (squareSize / 2))
-            # point3 = random.randint(150 - (squareSize / 20), 150 + (squareSize / 20)) * 10
-            # point4 = random.randint(50 - (squareSize / 20), 50 + (squareSize / 20)) * 10
-
-            problem[point] = (point1, point2, point3, point4)
-
-            # Checks that the point is 15 units away from all previous points
-            validPoint = checkValidProblem(problem)
-
-    # Returns the array
-    return problem
+        # Indexes of the problems that still need a valid point in this position
+        remaining = numpy.arange(0, numberOfProblems)
+
+        for _ in range(0, MaxPointAttempts):
+            problems[remaining, point] = generator.integers(lowValues, highValues, size=(len(remaining), 4))
+
+            # Gets the distances from the new points to the previous points in the same problem
+            newPoints = problems[remaining, point, None, :].astype(float)
+            previousPoints = problems[remaining, :point, :].astype(float)
+            firstDistances = numpy.hypot(newPoints[..., 0] - previousPoints[..., 0], newPoints[..., 1] - previousPoints[..., 1])
+            secondDistances = numpy.hypot(newPoints[..., 2] - previousPoints[..., 2], newPoints[..., 3] - previousPoints[..., 3])
+
+            # Keeps the problems where the new point is far enough away from all the previous points
+            valid = numpy.all((firstDistances >= MinimumPointDistance) & (secondDistances >= MinimumPointDistance), axis=1)
+            remaining = remaining[~valid]
+
+            if (len(remaining) == 0):
+                break
+        else:
+            raise ValueError("The square is too small to fit " + str(numberOfPoints) + " valid points")
+
+    return problems
+
+# Converts a problem array into the list of tuples that the evaluator and agents use
+def getProblemList(problemArray):
+    return [tuple(point) for point in numpy.asarray(problemArray).tolist()]
+
+# endregion
+
+# region Canonical Problems
+
+# Rounds the coordinates of the problems to the nearest roundNumber
+# Halves are rounded to the nearest even number in the same way as the built-in round
+def roundProblems(problems, roundNumber=1):
+    return (roundNumber * numpy.round(numpy.asarray(problems) / float(roundNumber))).astype(numpy.int64)
+
+# Rounds the coordinates of a batch of problems, of shape (numberOfProblems, numberOfPoints, 4), to the nearest
+# roundNumber and sorts the points of each problem by x1, then y1, then x2, then y2
+# Points that round to the same values keep their original order
+# Returns the sorted problems, the permutations, where sortedProblems[b, i] = roundedProblems[b, permutations[b, i]],
+# and the inverse permutations, where inversePermutations[b, permutations[b, i]] = i
+def getCanonicalProblems(problems, roundNumber=1):
+    roundedProblems = roundProblems(problems, roundNumber)
+
+    # lexsort uses the last key as the first sort key
+    permutations = numpy.lexsort((roundedProblems[..., 3], roundedProblems[..., 2],
+                                  roundedProblems[..., 1], roundedProblems[..., 0]), axis=-1)
+    sortedProblems = numpy.take_along_axis(roundedProblems, permutations[..., None], axis=-2)
+
+    inversePermutations = numpy.empty_like(permutations)
+    numpy.put_along_axis(inversePermutations, permutations, numpy.arange(0, permutations.shape[-1]), axis=-1)
+
+    return sortedProblems, permutations, inversePermutations
+
+# Gets the canonical form of a single problem, returning the sorted problem array, the permutation and its inverse
+def getCanonicalProblem(problem, roundNumber=1):
+    sortedProblems, permutations, inversePermutations = getCanonicalProblems(numpy.asarray(problem)[None], roundNumber)
+
+    return sortedProblems[0], permutations[0], inversePermutations[0]
+
+# Gets the canonical form of a batch of problems where problems that are translations or mirror images of each other
+# have the same canonical form
+# The routing grid is the same when it is moved, when it is flipped top to bottom and when it is flipped left to right,
+# which also swaps the two pins of every connection so that the first pin stays in the left square
+# Each problem is moved so its smallest x and y are 0 and the mirror image with the lowest sorted points is used
+# The permutations map the points of the canonical problems back to the points of the problems given
+def getSymmetricCanonicalProblems(problems, roundNumber=1):
+    problems = numpy.asarray(problems, dtype=numpy.int64)
+    x1, y1, x2, y2 = problems[..., 0], problems[..., 1], problems[..., 2], problems[..., 3]
+
+    # The problem, its top to bottom mirror image, its left to right mirror image and both together
+    images = [numpy.stack((x1, y1, x2, y2), axis=-1), numpy.stack((x1, -y1, x2, -y2), axis=-1),
+              numpy.stack((-x2, y2, -x1, y1), axis=-1), numpy.stack((-x2, -y2, -x1, -y1), axis=-1)]
+
+    bestProblems, bestPermutations, bestInverses = None, None, None
+    for image in images:
+        # Moves the problem so its smallest x and y coordinates are 0
+        xOrigin = image[..., 0::2].min(axis=(-2, -1))
+        yOrigin = image[..., 1::2].min(axis=(-2, -1))
+        image = image - numpy.stack((xOrigin, yOrigin, xOrigin, yOrigin), axis=-1)[..., None, :]
+
+        sortedProblems, permutations, inversePermutations = getCanonicalProblems(image, roundNumber)
+        if (bestProblems is None):
+            bestProblems, bestPermutations, bestInverses = sortedProblems, permutations, inversePermutations
+            continue
+
+        # Keeps the image for the problems where its sorted values are lower at the first value that differs
+        flatProblems = sortedProblems.reshape(len(sortedProblems), -1)
+        flatBest = bestProblems.reshape(len(bestProblems), -1)
+        different = flatProblems != flatBest
+        firstDifference = different.argmax(axis=1)[:, None]
+        lower = different.any(axis=1) & (numpy.take_along_axis(flatProblems, firstDifference, axis=1) <
+                                         numpy.take_along_axis(flatBest, firstDifference, axis=1))[:, 0]
+
+        bestProblems[lower] = sortedProblems[lower]
+        bestPermutations[lower] = permutations[lower]
+        bestInverses[lower] = inversePermutations[lower]
+
+    return bestProblems, bestPermutations, bestInverses
+
+# Gets the symmetric canonical form of a single problem, returning the canonical problem, the permutation and its inverse
+def getSymmetricCanonicalProblem(problem, roundNumber=1):
+    sortedProblems, permutations, inversePermutations = getSymmetricCanonicalProblems(numpy.asarray(problem)[None], roundNumber)
+
+    return sortedProblems[0], permutations[0], inversePermutations[0]
+
+# Gets the problem that the agents learn with, which is the rounded problem with its points in canonical order
+# Returns the permuted problem, the permutation and the key the canonical problem is stored under
+def getPermutedProblem(problem, roundNumber=1, reduceSymmetry=False):
+    if (reduceSymmetry):
+        # Moves and mirrors the problem so symmetric problems have the same key
+        # The problem itself is still used for routing, with its points in the same order as the canonical problem
+        canonicalArray, permutation, _ = getSymmetricCanonicalProblem(problem, roundNumber)
+        permutedArray = roundProblems(problem, roundNumber)[permutation]
+    else:
+        # Rounds all the points to the nearest roundNumber and sorts them
+        permutedArray, permutation, _ = getCanonicalProblem(problem, roundNumber)
+        canonicalArray = permutedArray
+
+    return getProblemList(permutedArray), permutation.tolist(), canonicalArray.tobytes()
+
+# endregion
+
+# region Processes
+
+# Gets the multiprocessing context that starts worker processes by forking
+# Other start methods import the main module again in every worker, which would run the test scripts' input prompts,
+# so the workers always fork and parallel work is refused where forking isn't available (such as on Windows)
+def getForkContext():
+    if ("fork" not in multiprocessing.get_all_start_methods()):
+        raise RuntimeError("Worker processes need the fork start method, which isn't available on " + sys.platform + ", so use 1 worker")
+
+    return multiprocessing.get_context("fork")
 
 # endregion
 